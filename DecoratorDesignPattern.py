@@ -300,4 +300,894 @@ def slow_down(func):
     def wrapper_slow_down(*args, **kwargs):
         time.sleep(1)
         return func(*args, **kwargs)
-    return wrapper_slow_down
\ No newline at end of file
+    return wrapper_slow_down
+
+"""Record latency histograms instead of printing"""
+
+import asyncio
+import inspect
+import itertools
+import threading
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of nanoseconds: 16 linear sub-buckets per power of two, so every
+    bucket is within ~6% of the true value. Each thread writes to its own counts, read()
+    merges them, so recording never takes a lock.
+    """
+    SUB_BUCKETS = 16
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()  # only taken when a new thread shows up
+
+    @classmethod
+    def bucket(cls, ns):
+        shift = max(ns.bit_length() - 5, 0)
+        return shift * cls.SUB_BUCKETS + (ns >> shift)
+
+    @classmethod
+    def bucket_upper_bound(cls, index):
+        if index < 2 * cls.SUB_BUCKETS:
+            return index
+        shift = index // cls.SUB_BUCKETS - 1
+        return ((index - shift * cls.SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self, seconds):
+        try:
+            counts = self._local.counts
+        except AttributeError:
+            counts = self._local.counts = {}
+            with self._lock:
+                self._shards.append(counts)
+        index = self.bucket(int(seconds * 1e9))
+        counts[index] = counts.get(index, 0) + 1
+
+    def read(self):
+        merged = {}
+        with self._lock:
+            shards = list(self._shards)
+        for counts in shards:
+            for index, n in list(counts.items()):
+                merged[index] = merged.get(index, 0) + n
+        return merged
+
+    def percentiles(self, *ps):
+        merged = self.read()
+        total = sum(merged.values())
+        result = {}
+        for p in ps:
+            rank, seen = p / 100 * total, 0
+            for index in sorted(merged):
+                seen += merged[index]
+                if seen >= rank:
+                    result[p] = self.bucket_upper_bound(index) / 1e9
+                    break
+            else:
+                result[p] = 0.0
+        return result
+
+# function name -> (histogram, call counter); read it with latency_report()
+LATENCY_REGISTRY = {}
+
+def latency_report():
+    """p50/p90/p99/max in seconds and the number of calls, per decorated function"""
+    report = {}
+    for name, (histogram, calls) in LATENCY_REGISTRY.items():
+        p = histogram.percentiles(50, 90, 99, 100)
+        report[name] = {"calls": calls.count, "sampled": sum(histogram.read().values()),
+                        "p50": p[50], "p90": p[90], "p99": p[99], "max": p[100]}
+    return report
+
+class _CallCounter:
+    def __init__(self):
+        self._calls = itertools.count(1)  # next() on itertools.count is atomic in CPython
+        self.count = 0
+
+    def __call__(self):
+        self.count = next(self._calls)
+        return self.count
+
+def profiled(func=None, *, sample_every=1):
+    """
+    Record how long func takes into LATENCY_REGISTRY. Works for plain functions, coroutine
+    functions and generator functions (only the time spent inside the generator is counted).
+    sample_every=N times one call out of N, 0 turns timing off and only counts calls;
+    the setting can be changed later through wrapper.sample_every.
+    """
+    if func is None:
+        return functools.partial(profiled, sample_every=sample_every)
+
+    histogram = LatencyHistogram()
+    calls = _CallCounter()
+    LATENCY_REGISTRY[func.__qualname__] = (histogram, calls)
+
+    def sampled():
+        n = calls()  # counted whether or not the call is timed
+        every = wrapper.sample_every
+        return bool(every) and n % every == 0
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not sampled():
+                return await func(*args, **kwargs)
+            t = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter() - t)
+
+    elif inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            gen = func(*args, **kwargs)
+            if not sampled():
+                return (yield from gen)
+            active = 0.0
+
+            def resume(method, value):
+                nonlocal active
+                t = time.perf_counter()
+                try:
+                    return method(value)
+                finally:
+                    active += time.perf_counter() - t
+
+            try:
+                item = resume(gen.send, None)
+                while True:
+                    try:
+                        sent = yield item
+                    except GeneratorExit:
+                        gen.close()
+                        raise
+                    except BaseException as exc:
+                        item = resume(gen.throw, exc)
+                    else:
+                        item = resume(gen.send, sent)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                histogram.record(active)
+
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not sampled():
+                return func(*args, **kwargs)
+            t = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter() - t)
+
+    wrapper.sample_every = sample_every
+    wrapper.histogram = histogram
+    return wrapper
+
+@profiled
+def profiled_reverse(string):
+    return string[::-1]
+
+@profiled(sample_every=10)
+async def profiled_sleep(seconds):
+    await asyncio.sleep(seconds)
+
+@profiled
+def profiled_countdown(n):
+    while n:
+        yield n
+        n -= 1
+
+for _ in range(1000):
+    profiled_reverse('Able was I ere I saw Elba')
+
+async def sleep_many():
+    await asyncio.gather(*(profiled_sleep(0.001) for _ in range(50)))
+
+asyncio.run(sleep_many())
+list(profiled_countdown(100))
+
+for name, stats in latency_report().items():
+    print(name, stats)
+
+"""Cache the results of the decorated function"""
+
+import collections
+import sys
+
+def approx_size(obj, _seen=None):
+    """sys.getsizeof of obj plus what it contains, for the usual containers"""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, seen) for item in obj)
+    return size
+
+class MemoCache:
+    """
+    The store behind memoize: LRU or LFU eviction, optional time-to-live, a limit on the
+    number of entries (maxsize=None for no limit) and on their approximate size in bytes,
+    and hit/miss/eviction counters.
+    """
+    _MISSING = object()
+
+    def __init__(self, policy="lru", maxsize=128, ttl=None, max_bytes=None):
+        if policy not in ("lru", "lfu"):
+            raise ValueError("Invalid cache policy")
+        self.policy = policy
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries = {}  # key -> [value, size, expires, frequency]
+        self.order = collections.OrderedDict()  # LRU: keys from oldest to newest
+        self.expiry_order = collections.OrderedDict()  # TTL: keys in the order they expire
+        self.by_frequency = collections.defaultdict(collections.OrderedDict)  # LFU buckets
+        self.min_frequency = 0
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, count_miss=True):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += count_miss
+                return self._MISSING
+            self.hits += 1
+            self._touch(key, entry)
+            return entry[0]
+
+    def count(self, hit):
+        """Count a lookup that get() was told not to count"""
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key, value):
+        size = approx_size(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # would evict everything else and still not fit
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if self.ttl is not None:
+                self._purge_expired()
+            while self.entries and ((self.maxsize is not None and len(self.entries) >= self.maxsize)
+                                    or (self.max_bytes is not None and self.bytes + size > self.max_bytes)):
+                self._evict()
+            if self.maxsize is not None and self.maxsize <= 0:
+                return
+            self.entries[key] = [value, size, expires, 1]
+            self.bytes += size
+            if expires is not None:
+                self.expiry_order[key] = None
+            if self.policy == "lru":
+                self.order[key] = None
+            else:
+                self.by_frequency[1][key] = None
+                self.min_frequency = 1
+
+    def _touch(self, key, entry):
+        if self.policy == "lru":
+            self.order.move_to_end(key)
+            return
+        frequency = entry[3]
+        bucket = self.by_frequency[frequency]
+        del bucket[key]
+        if not bucket:
+            del self.by_frequency[frequency]
+            if self.min_frequency == frequency:
+                self.min_frequency = frequency + 1
+        entry[3] = frequency + 1
+        self.by_frequency[frequency + 1][key] = None
+
+    def _purge_expired(self):
+        # one ttl for every entry, so insertion order is expiry order: stop at the first live one
+        now = time.monotonic()
+        while self.expiry_order:
+            key = next(iter(self.expiry_order))
+            if self.entries[key][2] >= now:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+    def _remove(self, key):
+        value, size, expires, frequency = self.entries.pop(key)
+        self.bytes -= size
+        if expires is not None:
+            del self.expiry_order[key]
+        if self.policy == "lru":
+            del self.order[key]
+        else:
+            bucket = self.by_frequency[frequency]
+            del bucket[key]
+            if not bucket:
+                del self.by_frequency[frequency]
+
+    def _evict(self):
+        if self.policy == "lru":
+            key = next(iter(self.order))
+        else:
+            if self.min_frequency not in self.by_frequency:
+                self.min_frequency = min(self.by_frequency)
+            key = next(iter(self.by_frequency[self.min_frequency]))
+        self._remove(key)
+        self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "expirations": self.expirations, "size": len(self.entries), "bytes": self.bytes}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.order.clear()
+            self.expiry_order.clear()
+            self.by_frequency.clear()
+            self.bytes = 0
+
+_KWARGS_MARK = object()
+
+def _make_key(args, kwargs):
+    if not kwargs:
+        return args
+    return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+
+def memoize(func=None, *, policy="lru", maxsize=128, ttl=None, max_bytes=None):
+    """
+    Remember the results of func by its arguments (which must be hashable).
+    Concurrent misses on the same key compute it once: the first caller computes,
+    the others wait for it (a Lock per key for threads, a Task per key for coroutines)
+    and are counted as hits. maxsize=None keeps every result.
+    """
+    if func is None:
+        return functools.partial(memoize, policy=policy, maxsize=maxsize, ttl=ttl, max_bytes=max_bytes)
+
+    cache = MemoCache(policy, maxsize, ttl, max_bytes)
+    in_flight = {}  # key -> Lock or Task of the call computing it
+    in_flight_lock = threading.Lock()
+
+    if inspect.iscoroutinefunction(func):
+        def finish(key, task):
+            if in_flight.get(key) is task:
+                del in_flight[key]
+            # exception() also marks it retrieved when nobody was waiting any more
+            if not task.cancelled() and task.exception() is None:
+                cache.put(key, task.result())
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = _make_key(args, kwargs)
+            value = cache.get(key, count_miss=False)
+            if value is not MemoCache._MISSING:
+                return value
+            task = in_flight.get(key)
+            if task is None or task.get_loop() is not asyncio.get_running_loop():
+                cache.count(hit=False)
+                # the call runs as its own task: cancelling one caller only stops
+                # that caller waiting, the others still get the result
+                task = in_flight[key] = asyncio.ensure_future(func(*args, **kwargs))
+                task.add_done_callback(functools.partial(finish, key))
+                return await asyncio.shield(task)
+            value = await asyncio.shield(task)
+            cache.count(hit=True)
+            return value
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = _make_key(args, kwargs)
+            value = cache.get(key, count_miss=False)
+            if value is not MemoCache._MISSING:
+                return value
+            with in_flight_lock:
+                key_lock = in_flight.setdefault(key, threading.Lock())
+            try:
+                with key_lock:
+                    # whoever held the lock before us may have filled the cache already
+                    value = cache.get(key, count_miss=False)
+                    if value is MemoCache._MISSING:
+                        cache.count(hit=False)
+                        value = func(*args, **kwargs)
+                        cache.put(key, value)
+            finally:
+                with in_flight_lock:
+                    if in_flight.get(key) is key_lock and not key_lock.locked():
+                        del in_flight[key]
+            return value
+
+    wrapper.cache = cache
+    wrapper.cache_stats = cache.stats
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+lru_memoize = functools.partial(memoize, policy="lru")
+lfu_memoize = functools.partial(memoize, policy="lfu")
+
+def ttl_memoize(ttl, **options):
+    return memoize(ttl=ttl, **options)
+
+@memoize(maxsize=1000)
+def fibonacci(n):
+    return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)
+
+print(fibonacci(300))
+print(fibonacci.cache_stats())
+
+"""Fuse several decorators into one wrapper"""
+
+import contextlib
+import io
+
+class Instrumentation:
+    """
+    @counter @benchmark @logging stacks three wrappers: three extra frames, and *args/**kwargs
+    repacked by each of them on every call. instrument() generates ONE wrapper that contains
+    only the code of the concerns that are switched on. Switching a concern on or off later
+    recompiles that wrapper and swaps its __code__, so callers keep the same function object.
+    """
+    CONCERNS = ("count", "time", "log", "debug")
+
+    def __init__(self, func, **enabled):
+        self.func = func
+        self.enabled = {name: bool(enabled.get(name, False)) for name in self.CONCERNS}
+        self.latency = LatencyHistogram()
+        self._cells = []                 # per-thread call counts, summed by count()
+        self._tls = threading.local()
+        self._lock = threading.Lock()
+        # the generated code looks its helpers up in this namespace
+        self.namespace = {
+            "_func": func,
+            "_tls": self._tls,
+            "_new_cell": self._new_cell,
+            "_perf_counter": time.perf_counter,
+            "_record_time": self.latency.record,
+            "_log": self._log,
+            "_debug_call": self._debug_call,
+            "_debug_return": self._debug_return,
+        }
+        self.wrapper = None
+        self._compile()
+        functools.update_wrapper(self.wrapper, func)
+        self.wrapper.instrumentation = self
+
+    def _compile(self):
+        lines = ["def wrapper(*args, **kwargs):"]
+        if self.enabled["count"]:
+            lines += ["    try:",
+                      "        _tls.cell[0] += 1",
+                      "    except AttributeError:",
+                      "        _new_cell()"]
+        if self.enabled["debug"]:
+            lines.append("    _debug_call(args, kwargs)")
+        if self.enabled["time"]:
+            lines.append("    _t = _perf_counter()")
+        lines.append("    _res = _func(*args, **kwargs)")
+        if self.enabled["time"]:
+            lines.append("    _record_time(_perf_counter() - _t)")
+        if self.enabled["log"]:
+            lines.append("    _log(args, kwargs)")
+        if self.enabled["debug"]:
+            lines.append("    _debug_return(_res)")
+        lines.append("    return _res")
+        exec("\n".join(lines), self.namespace)
+        if self.wrapper is None:
+            self.wrapper = self.namespace["wrapper"]
+        else:
+            self.wrapper.__code__ = self.namespace["wrapper"].__code__
+
+    def set(self, **concerns):
+        for name, on in concerns.items():
+            if name not in self.enabled:
+                raise ValueError("Invalid concern: {}".format(name))
+            self.enabled[name] = bool(on)
+        with self._lock:
+            self._compile()
+
+    def enable(self, *names):
+        self.set(**{name: True for name in names})
+
+    def disable(self, *names):
+        self.set(**{name: False for name in names})
+
+    def _new_cell(self):
+        # first call from this thread: it gets its own cell, counted once
+        self._tls.cell = [1]
+        with self._lock:
+            self._cells.append(self._tls.cell)
+
+    def count(self):
+        with self._lock:
+            return sum(cell[0] for cell in self._cells)
+
+    def _log(self, args, kwargs):
+        print(self.func.__name__, args, kwargs)
+
+    def _debug_call(self, args, kwargs):
+        signature = ", ".join([repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()])
+        print(f"Calling {self.func.__name__}({signature})")
+
+    def _debug_return(self, value):
+        print(f"{self.func.__name__}() returned {value!r}")
+
+def instrument(func=None, *, count=True, time=False, log=False, debug=False):
+    if func is None:
+        return functools.partial(instrument, count=count, time=time, log=log, debug=debug)
+    return Instrumentation(func, count=count, time=time, log=log, debug=debug).wrapper
+
+@instrument(count=True, time=True, log=True)
+def fused_reverse_string(string):
+    return string[::-1]
+
+print(fused_reverse_string('Able was I ere I saw Elba'))
+fused_reverse_string.instrumentation.disable("log")
+print(fused_reverse_string('Able was I ere I saw Elba'))
+print('{0} has been used: {1}x'.format(fused_reverse_string.__name__,
+                                       fused_reverse_string.instrumentation.count()))
+
+if __name__ == "__main__":
+    def per_call_ns(func, calls=100000):
+        with contextlib.redirect_stdout(io.StringIO()):  # measure the wrappers, not the terminal
+            t = time.perf_counter()
+            for _ in range(calls):
+                func("abc")
+            return (time.perf_counter() - t) / calls * 1e9
+
+    def plain(string):
+        return string[::-1]
+
+    stacked = counter(benchmark(logging(plain)))
+    fused = instrument(plain, count=True, time=True, log=True)
+    print(f"plain function            : {per_call_ns(plain):7.0f} ns/call")
+    print(f"@counter@benchmark@logging: {per_call_ns(stacked):7.0f} ns/call")
+    print(f"fused count+time+log      : {per_call_ns(fused):7.0f} ns/call")
+    fused.instrumentation.disable("log", "time")
+    print(f"fused count only          : {per_call_ns(fused):7.0f} ns/call")
+    fused.instrumentation.disable("count")
+    print(f"fused, everything off     : {per_call_ns(fused):7.0f} ns/call")
+
+"""Log from a background thread"""
+
+import atexit
+
+class AsyncLogBackend:
+    """
+    logging and debug call print (terminal I/O) and repr() every argument on the caller's
+    thread. Here the caller only appends a raw record (function name, args, result) to a
+    bounded deque; a writer thread does the repr formatting and writes whole batches.
+    Arguments are formatted later, so an argument mutated right after the call may be
+    logged in its new state.
+    When the buffer is full, policy="drop" drops the record (counted in .dropped) and
+    policy="block" makes the caller wait for room.
+    """
+
+    def __init__(self, stream=None, capacity=10000, batch_size=256, flush_interval=0.1, policy="drop"):
+        if policy not in ("drop", "block"):
+            raise ValueError("Invalid overflow policy")
+        self.stream = stream
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.records = collections.deque()  # append/popleft are atomic, no lock needed
+        self.dropped = 0
+        self.written = 0
+        self.wakeup = threading.Event()     # writer: records waiting / closing
+        self.room = threading.Condition()   # "block" callers: space freed
+        self.drain_lock = threading.Lock()  # one batch written at a time, in order
+        self.writer = None
+        self.closed = False
+        self._start_lock = threading.Lock()
+
+    def put(self, record):
+        if self.closed:
+            # no writer any more, fall back to a synchronous write
+            (self.stream or sys.stdout).write(self.format(record))
+            self.written += 1
+            return
+        if self.writer is None:
+            self._start()
+        if len(self.records) >= self.capacity:
+            if self.policy == "drop":
+                self.dropped += 1
+                return
+            with self.room:
+                while len(self.records) >= self.capacity and not self.closed:
+                    self.wakeup.set()
+                    self.room.wait(self.flush_interval)
+        self.records.append(record)
+        if len(self.records) >= self.batch_size:
+            self.wakeup.set()
+
+    def _start(self):
+        with self._start_lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._run, daemon=True)
+                self.writer.start()
+                atexit.register(self.close)
+
+    @staticmethod
+    def format(record):
+        kind, name, args, kwargs, value = record
+        if kind == "log":
+            return "{} {!r} {!r}\n".format(name, args, kwargs)
+        if kind == "call":
+            signature = ", ".join([repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()])
+            return f"Calling {name}({signature})\n"
+        return f"{name}() returned {value!r}\n"
+
+    def _drain(self):
+        batch = []
+        with self.drain_lock:
+            while self.records and len(batch) < self.batch_size:
+                batch.append(self.format(self.records.popleft()))
+            if batch:
+                stream = self.stream or sys.stdout
+                stream.write("".join(batch))
+                stream.flush()
+                self.written += len(batch)
+        if batch:
+            with self.room:
+                self.room.notify_all()
+        return bool(batch)
+
+    def _run(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            while self._drain():
+                pass
+
+    def flush(self):
+        """Write everything buffered so far; the writer keeps running"""
+        while self._drain():
+            pass
+
+    def close(self):
+        """Write everything still buffered and stop the writer"""
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        if self.writer is not None:
+            self.writer.join()
+        while self._drain():
+            pass
+
+LOG_BACKEND = AsyncLogBackend()
+
+def async_logging(func=None, *, backend=None):
+    """Same output as logging, written by the backend's writer thread"""
+    if func is None:
+        return functools.partial(async_logging, backend=backend)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        res = func(*args, **kwargs)
+        (backend or LOG_BACKEND).put(("log", func.__name__, args, kwargs, None))
+        return res
+    return wrapper
+
+def async_debug(func=None, *, backend=None):
+    """Same output as debug, written by the backend's writer thread"""
+    if func is None:
+        return functools.partial(async_debug, backend=backend)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        log = backend or LOG_BACKEND
+        log.put(("call", func.__name__, args, kwargs, None))
+        value = func(*args, **kwargs)
+        log.put(("return", func.__name__, None, None, value))
+        return value
+    return wrapper
+
+@async_debug
+@async_logging
+def quiet_reverse_string(string):
+    return string[::-1]
+
+quiet_reverse_string('Able was I ere I saw Elba')
+LOG_BACKEND.flush()  # write before the next example prints
+
+if __name__ == "__main__":
+    sink = io.StringIO()
+    for policy in ("drop", "block"):
+        backend = AsyncLogBackend(sink, capacity=1000, policy=policy)
+        logged = async_logging(backend=backend)(lambda x: x)
+        t = time.perf_counter()
+        for i in range(200000):
+            logged(i)
+        elapsed = time.perf_counter() - t
+        backend.close()
+        print(f"{policy:>5}: {elapsed / 200000 * 1e9:.0f} ns/call on the caller, "
+              f"{backend.written} written, {backend.dropped} dropped")
+
+"""Limit the call rate and the concurrency of a function"""
+
+import concurrent.futures
+import weakref
+
+class TokenBucket:
+    """rate calls per second on average, with bursts of up to `burst` calls"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token now and return how long the caller must wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # may go negative: the caller's token is reserved in the future
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class SlidingWindow:
+    """At most `limit` calls in any window of `period` seconds"""
+
+    def __init__(self, limit, period=1.0):
+        self.limit = limit
+        self.period = period
+        self.scheduled = collections.deque()  # start times handed out, oldest first
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            while self.scheduled and self.scheduled[0] <= now - self.period:
+                self.scheduled.popleft()
+            start = now
+            if len(self.scheduled) >= self.limit:
+                start = max(now, self.scheduled[-self.limit] + self.period)
+            self.scheduled.append(start)
+            return start - now
+
+class QueueingStats:
+    """How long callers waited for the limiter"""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.calls = 0
+        self.delayed = 0
+        self.max_wait = 0.0
+
+    def record(self, wait):
+        self.histogram.record(wait)
+        self.calls += 1
+        if wait > 1e-4:  # ignore the cost of an uncontended acquire
+            self.delayed += 1
+            self.max_wait = max(self.max_wait, wait)
+
+    def report(self):
+        p = self.histogram.percentiles(50, 99)
+        return {"calls": self.calls, "delayed": self.delayed,
+                "p50_wait": p[50], "p99_wait": p[99], "max_wait": self.max_wait}
+
+def _per_key(factory, key):
+    """Return get(args, kwargs) -> limiter; one limiter per key (or a single one)"""
+    limiters = {}
+    lock = threading.Lock()
+
+    def get(args, kwargs):
+        k = key(*args, **kwargs) if key is not None else None
+        limiter = limiters.get(k)
+        if limiter is None:
+            with lock:
+                limiter = limiters.setdefault(k, factory())
+        return limiter
+    return get
+
+def rate_limit(rate=None, *, burst=1, limit=None, period=1.0, key=None):
+    """
+    Token bucket with rate_limit(rate=..., burst=...), sliding window with
+    rate_limit(limit=..., period=...). key(*args, **kwargs) gives a separate limit per key,
+    e.g. per host. Waiting callers sleep once for exactly their delay (asyncio.sleep for
+    coroutine functions) instead of polling.
+    """
+    if (rate is None) == (limit is None):
+        raise ValueError("give either rate (token bucket) or limit (sliding window)")
+    if rate is not None:
+        limiter_for = _per_key(lambda: TokenBucket(rate, burst), key)
+    else:
+        limiter_for = _per_key(lambda: SlidingWindow(limit, period), key)
+
+    def decorator(func):
+        stats = QueueingStats()
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                delay = limiter_for(args, kwargs).reserve()
+                stats.record(delay)
+                if delay:
+                    await asyncio.sleep(delay)
+                return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                delay = limiter_for(args, kwargs).reserve()
+                stats.record(delay)
+                if delay:
+                    time.sleep(delay)
+                return func(*args, **kwargs)
+
+        wrapper.limit_stats = stats.report
+        return wrapper
+    return decorator
+
+def max_concurrency(limit, *, key=None):
+    """Allow at most `limit` calls running at the same time (per key)"""
+
+    def decorator(func):
+        stats = QueueingStats()
+
+        if inspect.iscoroutinefunction(func):
+            # an asyncio.Semaphore belongs to the loop it is first used on, so every
+            # running loop gets its own set; a closed loop's set goes away with the loop
+            loops = weakref.WeakKeyDictionary()
+            loops_lock = threading.Lock()
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                loop = asyncio.get_running_loop()
+                semaphore_for = loops.get(loop)
+                if semaphore_for is None:
+                    with loops_lock:
+                        semaphore_for = loops.setdefault(
+                            loop, _per_key(lambda: asyncio.Semaphore(limit), key))
+                semaphore = semaphore_for(args, kwargs)
+                t = time.perf_counter()
+                async with semaphore:
+                    stats.record(time.perf_counter() - t)
+                    return await func(*args, **kwargs)
+        else:
+            semaphore_for = _per_key(lambda: threading.BoundedSemaphore(limit), key)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                semaphore = semaphore_for(args, kwargs)
+                t = time.perf_counter()
+                with semaphore:
+                    stats.record(time.perf_counter() - t)
+                    return func(*args, **kwargs)
+
+        wrapper.limit_stats = stats.report
+        return wrapper
+    return decorator
+
+def host_of(url):
+    return url.split("/")[2]
+
+@max_concurrency(2, key=host_of)
+@rate_limit(rate=20, burst=5, key=host_of)
+def fake_fetch_url(url):
+    time.sleep(0.01)  # stands in for the request
+    return url
+
+start = time.perf_counter()
+with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+    list(pool.map(fake_fetch_url, ["https://www.python.org/{}".format(i) for i in range(20)]
+                                  + ["https://www.google.com/{}".format(i) for i in range(20)]))
+print(f"40 rate limited calls over 2 hosts in {time.perf_counter() - start:.2f} secs")
+print("concurrency:", fake_fetch_url.limit_stats())
+print("rate      :", fake_fetch_url.__wrapped__.limit_stats())
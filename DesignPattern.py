@@ -85,6 +85,494 @@ if __name__ == '__main__':
 	y.undo(x)
 
 	print(x.content + "\n\n")  #file = object , content = "First vision of Data "
+
+"""
+Delta Memento: X.write does content += string, which copies the whole document on every
+write, and every Memento holds a full copy of content. DeltaX keeps the document as a
+linked list of immutable chunks, newest first. A snapshot is just a reference to the
+newest chunk: everything before it is shared with the live document and with every other
+snapshot, so a save costs one small object and undo is a single assignment.
+"""
+
+import time
+import tracemalloc
+
+class _Chunk:
+    __slots__ = ("parent", "text", "length")
+
+    def __init__(self, parent, text):
+        self.parent = parent
+        self.text = text
+        self.length = (parent.length if parent else 0) + len(text)
+
+class DeltaMemento:
+    __slots__ = ("file", "head")
+
+    def __init__(self, file, head):
+        self.file = file
+        self.head = head  # shared prefix, never copied
+
+    @property
+    def content(self):
+        return _join_chunks(self.head)
+
+def _join_chunks(head):
+    parts = []
+    while head is not None:
+        parts.append(head.text)
+        head = head.parent
+    return "".join(reversed(parts))
+
+class DeltaX:
+    """Same interface as X (write, save, undo, content), with O(1) write, save and undo"""
+
+    def __init__(self, file_path):
+        self.file = file_path
+        self.head = None
+        self._cache = (None, "")  # (head, text) of the last content read
+
+    def write(self, string):
+        if string:
+            self.head = _Chunk(self.head, string)
+
+    @property
+    def content(self):
+        head, text = self._cache
+        if head is not self.head:
+            text = _join_chunks(self.head)
+            self._cache = (self.head, text)
+        return text
+
+    def __len__(self):
+        return self.head.length if self.head else 0
+
+    def save(self):
+        return DeltaMemento(self.file, self.head)
+
+    def undo(self, memento):
+        self.file = memento.file
+        self.head = memento.head
+
+def measure_snapshots(writer_class, snapshots=10000, line="data line\n"):
+    """Write one line and save after each, return (MB used by the snapshots, mean save time)"""
+    writer = writer_class("GFG.txt")
+    mementos = []
+    save_time = 0.0
+    tracemalloc.start()
+    for _ in range(snapshots):
+        writer.write(line)
+        t = time.perf_counter()
+        mementos.append(writer.save())
+        save_time += time.perf_counter() - t
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / 1e6, save_time / snapshots
+
+if __name__ == '__main__':
+    y = Y()
+    x = DeltaX("GFG.txt")
+    x.write("First vision of Data\n")
+    y.save(x)
+    x.write("Second vision of Data\n")
+    y.undo(x)
+    print(x.content + "\n\n")  # First vision of Data
+
+    for writer_class in (X, DeltaX):
+        memory, save_time = measure_snapshots(writer_class)
+        print(f"{writer_class.__name__:>6}: 10k snapshots use {memory:.1f} MB, save takes {save_time * 1e6:.2f} us")
+
+"""
+History caretaker: Y keeps exactly one memento, every save replaces it. History keeps
+every version with undo/redo, evicts the oldest ones when the stored bytes go over a
+budget, can compress older full-copy snapshots with zlib or lzma on a background thread,
+and finds any version by id with a binary search.
+"""
+
+import bisect
+import lzma
+import queue
+import sys
+import threading
+import weakref
+import zlib
+
+class CompressedMemento:
+    __slots__ = ("file", "data", "codec")
+
+    def __init__(self, memento, codec):
+        self.file = memento.file
+        self.data = codec.compress(memento.content.encode("utf-8"))
+        self.codec = codec
+
+    @property
+    def content(self):
+        return self.codec.decompress(self.data).decode("utf-8")
+
+def memento_bytes(memento):
+    """What keeping this memento costs; a DeltaMemento shares its content with the document"""
+    if isinstance(memento, DeltaMemento):
+        return sys.getsizeof(memento)
+    if isinstance(memento, CompressedMemento):
+        return len(memento.data)
+    return sys.getsizeof(memento.content)
+
+class History:
+
+    def __init__(self, max_bytes=None, compress_after=None, codec=zlib):
+        self.max_bytes = max_bytes
+        self.compress_after = compress_after  # versions kept uncompressed behind the newest
+        self.codec = codec
+        self.ids = []        # version ids, increasing, so bisect works
+        self.mementos = []
+        self.sizes = []
+        self.start = 0       # entries before start were evicted
+        self.position = -1   # index of the current version
+        self.next_id = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.to_compress = queue.Queue()
+        self.compressor = None
+        if compress_after is not None:
+            # the thread only holds a weak reference, and a None on the queue stops it:
+            # sent by close(), or by the finalizer when the History is garbage collected
+            self.compressor = threading.Thread(
+                target=History._compressor, args=(weakref.ref(self), self.to_compress), daemon=True)
+            self.compressor.start()
+            self._stop_compressor = weakref.finalize(self, self.to_compress.put, None)
+
+    """save the data, dropping the redo branch, return the version id"""
+
+    def save(self, x):
+        memento = x.save()
+        size = memento_bytes(memento)
+        with self.lock:
+            for i in range(self.position + 1, len(self.ids)):
+                self.bytes -= self.sizes[i]
+            del self.ids[self.position + 1:], self.mementos[self.position + 1:], self.sizes[self.position + 1:]
+            version = self.next_id
+            self.next_id += 1
+            self.ids.append(version)
+            self.mementos.append(memento)
+            self.sizes.append(size)
+            self.bytes += size
+            self.position = len(self.ids) - 1
+            self._evict()
+            if self.compressor is not None and self.position - self.compress_after >= self.start:
+                self.to_compress.put(self.ids[self.position - self.compress_after])
+        return version
+
+    def _evict(self):
+        # the current version is never evicted
+        while self.max_bytes is not None and self.bytes > self.max_bytes and self.start < self.position:
+            self.bytes -= self.sizes[self.start]
+            self.mementos[self.start] = None
+            self.start += 1
+        if self.start > 1024 and self.start * 2 > len(self.ids):
+            # compact now and then so eviction stays O(1) amortized
+            del self.ids[:self.start], self.mementos[:self.start], self.sizes[:self.start]
+            self.position -= self.start
+            self.start = 0
+
+    @staticmethod
+    def _compressor(ref, to_compress):
+        while True:
+            version = to_compress.get()
+            history = ref()
+            if version is None or history is None:
+                return
+            history._compress(version)
+            del history  # do not keep the History alive while waiting
+
+    def _compress(self, version):
+        with self.lock:
+            i = self._index(version)
+            memento = self.mementos[i] if i is not None else None
+        if memento is None or isinstance(memento, (CompressedMemento, DeltaMemento)):
+            return
+        compressed = CompressedMemento(memento, self.codec)  # the slow part, without the lock
+        with self.lock:
+            i = self._index(version)
+            if i is not None and self.mementos[i] is memento:
+                self.mementos[i] = compressed
+                self.bytes += len(compressed.data) - self.sizes[i]
+                self.sizes[i] = len(compressed.data)
+
+    def _index(self, version):
+        i = bisect.bisect_left(self.ids, version, self.start)
+        return i if i < len(self.ids) and self.ids[i] == version else None
+
+    """undo / redo the content, return False when there is nothing more to undo / redo"""
+
+    def undo(self, x):
+        with self.lock:
+            if self.position <= self.start:
+                return False
+            self.position -= 1
+            memento = self.mementos[self.position]
+        x.undo(memento)
+        return True
+
+    def redo(self, x):
+        with self.lock:
+            if self.position >= len(self.ids) - 1:
+                return False
+            self.position += 1
+            memento = self.mementos[self.position]
+        x.undo(memento)
+        return True
+
+    """jump to any version still in the history"""
+
+    def restore(self, x, version):
+        with self.lock:
+            i = self._index(version)
+            if i is None:
+                raise KeyError(version)
+            self.position = i
+            memento = self.mementos[i]
+        x.undo(memento)
+
+    def versions(self):
+        with self.lock:
+            return self.ids[self.start:]
+
+    """compress the versions already queued, then stop the compressor thread"""
+
+    def close(self):
+        if self.compressor is not None:
+            self._stop_compressor()
+            self.compressor.join()
+            self.compressor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == '__main__':
+    history = History(max_bytes=10 * 1024 * 1024, compress_after=10, codec=lzma)
+    x = X("GFG.txt")
+    first = None
+    for i in range(200):
+        x.write("Vision {} of Data\n".format(i))
+        version = history.save(x)
+        first = version if first is None else first
+    history.undo(x)
+    history.undo(x)
+    history.redo(x)
+    print(x.content.splitlines()[-1])  # Vision 198 of Data
+    history.restore(x, first)
+    print(x.content)                    # Vision 0 of Data
+    history.close()
+    print("History bytes after compression:", history.bytes)
+
+    # a million versions of a DeltaX document: each one costs one small object
+    history = History()
+    x = DeltaX("GFG.txt")
+    for i in range(1000000):
+        x.write("v")
+        history.save(x)
+    history.restore(x, 500000)
+    print("Version 500000 has", len(x), "characters")
+
+"""
+Persistent Memento store: the mementos above only live in memory. MementoLog appends them
+to a log file (header + file name + content, with a CRC32 so torn writes are detected),
+keeps an in-memory index of version -> offset, reads them back through mmap so the log is
+never loaded whole, and fsyncs once per batch of saves (group commit). compact() rewrites
+only the versions still wanted; on open the log is scanned and cut after the last valid
+record, which is how it recovers from a crash in the middle of a write.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+
+class MementoLog:
+    RECORD = struct.Struct("<IQIQ")  # crc32, version, file name length, content length
+
+    def __init__(self, path, sync_every=64, keep_last=None, compact_interval=None):
+        self.path = path
+        self.sync_every = sync_every
+        self.keep_last = keep_last
+        self.index = {}      # version -> offset of its record
+        self.next_version = 0
+        self.pending = 0     # appended but not fsynced yet
+        self.lock = threading.RLock()
+        self._map = None
+        self._recover()
+        self.log = open(path, "ab")
+        self.closed = threading.Event()
+        self.compactor = None
+        if compact_interval is not None:
+            self.compactor = threading.Thread(target=self._compactor, args=(compact_interval,), daemon=True)
+            self.compactor.start()
+
+    def _recover(self):
+        """Index every complete record and cut off a half written one at the end"""
+        if not os.path.exists(self.path):
+            open(self.path, "wb").close()
+        with open(self.path, "r+b") as f:
+            size = os.fstat(f.fileno()).st_size
+            offset = 0
+            if size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    while offset + self.RECORD.size <= size:
+                        crc, version, name_len, content_len = self.RECORD.unpack_from(m, offset)
+                        end = offset + self.RECORD.size + name_len + content_len
+                        if end > size or zlib.crc32(m[offset + 4:end]) != crc:
+                            break
+                        self.index[version] = offset
+                        self.next_version = max(self.next_version, version + 1)
+                        offset = end
+            if offset < size:
+                f.truncate(offset)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def append(self, memento):
+        name = memento.file.encode("utf-8")
+        content = memento.content.encode("utf-8")
+        with self.lock:
+            version = self.next_version
+            self.next_version += 1
+            header = self.RECORD.pack(0, version, len(name), len(content))
+            body = header[4:] + name + content
+            offset = self.log.tell()
+            self.log.write(struct.pack("<I", zlib.crc32(body)) + body)
+            self.index[version] = offset
+            self.pending += 1
+            if self.pending >= self.sync_every:
+                self.sync()
+        return version
+
+    def sync(self):
+        """Group commit: one flush + fsync for every record appended since the last one"""
+        with self.lock:
+            if self.pending:
+                self.log.flush()
+                os.fsync(self.log.fileno())
+                self.pending = 0
+
+    def _mapped(self, end):
+        # map (again) when the record lies beyond the current mapping
+        if self._map is None or len(self._map) < end:
+            self.log.flush()
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def read(self, version):
+        with self.lock:
+            offset = self.index[version]
+            m = self._mapped(offset + self.RECORD.size)
+            crc, _, name_len, content_len = self.RECORD.unpack_from(m, offset)
+            start = offset + self.RECORD.size
+            m = self._mapped(start + name_len + content_len)
+            name = m[start:start + name_len].decode("utf-8")
+            content = m[start + name_len:start + name_len + content_len].decode("utf-8")
+        return Memento(name, content)
+
+    def compact(self, versions=None):
+        """Rewrite the log with only `versions` (default: the keep_last newest ones)"""
+        with self.lock:
+            if versions is None:
+                versions = sorted(self.index)[-self.keep_last:] if self.keep_last else sorted(self.index)
+            self.sync()
+            tmp_path = self.path + ".compact"
+            new_index = {}
+            with open(tmp_path, "wb") as out:
+                m = self._mapped(os.path.getsize(self.path)) if self.index else None
+                for version in sorted(versions):
+                    offset = self.index[version]
+                    _, _, name_len, content_len = self.RECORD.unpack_from(m, offset)
+                    new_index[version] = out.tell()
+                    out.write(m[offset:offset + self.RECORD.size + name_len + content_len])
+                out.flush()
+                os.fsync(out.fileno())
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self.log.close()
+            os.replace(tmp_path, self.path)  # atomic: a crash leaves either the old or the new log
+            # the rename itself is only durable once the directory entry is on disk,
+            # before that records fsynced to the new file could vanish with it
+            directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+            self.log = open(self.path, "ab")
+            self.index = new_index
+
+    def _compactor(self, interval):
+        while not self.closed.wait(interval):
+            # rewriting holds the lock, so only do it when it reclaims something
+            if self.keep_last and len(self.index) > self.keep_last:
+                self.compact()
+
+    def close(self):
+        self.closed.set()
+        if self.compactor is not None:
+            self.compactor.join()  # it may be in the middle of a compact()
+        with self.lock:
+            self.sync()
+            if self._map is not None:
+                self._map.close()
+            self.log.close()
+
+class PersistentCaretaker:
+    """Like Y, but every save survives a restart"""
+
+    def __init__(self, log):
+        self.log = log
+
+    def save(self, x):
+        return self.log.append(x.save())
+
+    def undo(self, x, version):
+        x.undo(self.log.read(version))
+
+if __name__ == '__main__':
+    path = os.path.join(tempfile.mkdtemp(), "GFG.log")
+    log = MementoLog(path, sync_every=256)
+    caretaker = PersistentCaretaker(log)
+    x = X("GFG.txt")
+    x.write("First vision of Data\n")
+    first = caretaker.save(x)
+
+    t = time.perf_counter()
+    for i in range(1000):
+        x.write("line {}\n".format(i))
+        caretaker.save(x)
+    log.sync()
+    print(f"saved 1000 snapshots in {time.perf_counter() - t:.3f} s")
+
+    t = time.perf_counter()
+    for version in log.index:
+        log.read(version)
+    print(f"read {len(log.index)} snapshots in {time.perf_counter() - t:.3f} s")
+
+    # simulate a crash: the last record was only half written
+    log.close()
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 10)
+    log = MementoLog(path)
+    print("recovered", len(log.index), "snapshots")
+    PersistentCaretaker(log).undo(x, first)
+    print(x.content)
+
+    before = os.path.getsize(path)
+    log.keep_last = 10
+    log.compact()
+    print(f"compaction: {before} -> {os.path.getsize(path)} bytes")
+    log.close()
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
 ###################################################################################
 class GameState:
     def __init__(self, level, health):
@@ -124,6 +612,93 @@ game.load_state(saved_state)
 print("After loading saved state:")
 print(f"Level: {game._level}, Health: {game._health}")
 
+"""
+    Compact snapshots: every GameState carries a __dict__, which is most of its memory.
+    SlottedGameState drops it with __slots__. GameStateStore goes further and keeps all
+    states in two int arrays (one per field): a saved state is only a row index, and
+    many games can be saved or loaded in one call.
+"""
+from array import array
+
+class SlottedGameState:
+    __slots__ = ("level", "health")
+
+    def __init__(self, level, health):
+        self.level = level
+        self.health = health
+
+class GameStateStore:
+    def __init__(self):
+        self.levels = array("i")
+        self.healths = array("i")
+
+    def save_state(self, game):
+        self.levels.append(game._level)
+        self.healths.append(game._health)
+        return len(self.levels) - 1
+
+    def load_state(self, game, row):
+        game._level = self.levels[row]
+        game._health = self.healths[row]
+
+    def save_states(self, games):
+        """Save many games at once, return their rows (in the same order)"""
+        games = games if isinstance(games, (list, tuple)) else list(games)  # read both columns from one pass
+        first = len(self.levels)
+        self.levels.extend(game._level for game in games)
+        self.healths.extend(game._health for game in games)
+        return range(first, len(self.levels))
+
+    def load_states(self, games, rows):
+        levels, healths = self.levels, self.healths
+        for game, row in zip(games, rows):
+            game._level = levels[row]
+            game._health = healths[row]
+
+    def __getitem__(self, row):
+        # for code that wants a state object, e.g. Game.load_state(store[row])
+        return SlottedGameState(self.levels[row], self.healths[row])
+
+    def __len__(self):
+        return len(self.levels)
+
+# Usage
+store = GameStateStore()
+games = [Game() for _ in range(3)]
+for g in games:
+    g.play()
+rows = store.save_states(games)
+for g in games:
+    g.play()
+store.load_states(games, rows)
+print("After loading saved states:", [(g._level, g._health) for g in games])
+
+if __name__ == "__main__":
+    import tracemalloc
+
+    def bytes_per_snapshot(save_all, n=1000000):
+        game = Game()
+        tracemalloc.start()
+        snapshots = save_all(game, n)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del snapshots
+        return size / n
+
+    def _save_in_store(game, n):
+        snapshots = GameStateStore()
+        games = [game] * 10000
+        for _ in range(n // len(games)):
+            snapshots.save_states(games)
+        return snapshots
+
+    print("GameState        : {:.1f} bytes/snapshot".format(
+        bytes_per_snapshot(lambda game, n: [game.save_state() for _ in range(n)])))
+    print("SlottedGameState : {:.1f} bytes/snapshot".format(
+        bytes_per_snapshot(lambda game, n: [SlottedGameState(game._level, game._health) for _ in range(n)])))
+    print("GameStateStore   : {:.1f} bytes/snapshot".format(
+        bytes_per_snapshot(lambda game, n: _save_in_store(game, n))))
+
 """
     Factory Method is a Creational Design Pattern that allows an interface or a class to create an object,
     but lets subclasses decide which class or object to instantiate.
@@ -158,6 +733,89 @@ print(animal1.speak())  # Output: Woof!
 animal2 = AnimalFactory.create_animal("cat")
 print(animal2.speak())  # Output: Meow!
 
+"""
+    Registry-based factory: the if/elif chain compares strings one by one and needs an edit
+    for every new animal. AnimalRegistry looks the type up in a dict, new types register
+    themselves with a decorator (or through the "animals" entry point group of installed
+    packages), and with shared=True stateless animals are created once and then reused.
+    stateless=True only marks a class as safe to share; shared is read on every create(),
+    so it can be switched on or off at any time. Shared animals are read-only.
+"""
+from importlib import metadata
+
+def _read_only(instance):
+    """Freeze an already built instance: move it to a subclass that refuses attribute changes"""
+    cls = type(instance)
+
+    def refuse(self, *args):
+        raise AttributeError("shared {} instances are read-only".format(cls.__name__))
+    # empty __slots__ keeps the layout of cls, so __class__ can be swapped
+    instance.__class__ = type(cls.__name__, (cls,), {
+        "__slots__": (), "__setattr__": refuse, "__delattr__": refuse,
+        "__module__": cls.__module__, "__qualname__": cls.__qualname__})
+    return instance
+
+class AnimalRegistry:
+    def __init__(self, shared=False):
+        self.shared = shared
+        self.factories = {}  # animal_type -> (class, stateless)
+        self.instances = {}  # animal_type -> the read-only instance shared by every create()
+
+    def register(self, animal_type, stateless=False):
+        def decorator(cls):
+            self.factories[animal_type] = (cls, stateless)
+            self.instances.pop(animal_type, None)
+            return cls
+        return decorator
+
+    def load_entry_points(self, group="animals"):
+        """Register the classes that installed packages declare under `group`"""
+        for entry_point in metadata.entry_points(group=group):
+            self.register(entry_point.name)(entry_point.load())
+
+    def create(self, animal_type):
+        factory = self.factories.get(animal_type)
+        if factory is None:
+            raise ValueError("Invalid animal type")
+        cls, stateless = factory
+        if not (self.shared and stateless):
+            return cls()
+        instance = self.instances.get(animal_type)
+        if instance is None:
+            instance = self.instances.setdefault(animal_type, _read_only(cls()))
+        return instance
+
+ANIMALS = AnimalRegistry()
+ANIMALS.register("dog", stateless=True)(Dog)
+ANIMALS.register("cat", stateless=True)(Cat)
+
+@ANIMALS.register("cow", stateless=True)
+class Cow(Animal):
+    def speak(self):
+        return "Moo!"
+
+class RegistryAnimalFactory:
+    @staticmethod
+    def create_animal(animal_type):
+        return ANIMALS.create(animal_type)
+
+# Usage
+print(RegistryAnimalFactory.create_animal("cow").speak())  # Output: Moo!
+
+if __name__ == "__main__":
+    import timeit
+
+    shared_animals = AnimalRegistry(shared=True)
+    for animal_type, cls in (("dog", Dog), ("cat", Cat), ("cow", Cow)):
+        shared_animals.register(animal_type, stateless=True)(cls)
+
+    calls = 1000000
+    for name, create in (("if/elif", AnimalFactory.create_animal),
+                         ("registry", ANIMALS.create),
+                         ("registry, shared", shared_animals.create)):
+        seconds = timeit.timeit(lambda: create("cat"), number=calls)
+        print(f"{name:>16}: {calls / seconds / 1e6:.2f} million creates/sec")
+
 """
     The Builder Pattern is a creational pattern whose intent is to separate the construction of a complex 
     object from its representation so that you can use the same construction process to create different 
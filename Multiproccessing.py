@@ -153,3 +153,864 @@ if __name__ == "__main__":
 	# wait until processes finish 
 	p1.join() 
 	p2.join() 
+
+"""
+Segmented Sieve of Eratosthenes
+Mapping is_prime over every number sends a million ints to the workers and a million bools back.
+A segmented sieve gives each worker a contiguous range [lo, hi), crosses out the multiples of the
+small "base" primes inside that range and sends back only one number: how many primes it found.
+"""
+
+import math
+import sys
+import time
+import multiprocessing
+
+try:
+    import numpy as np  # optional, the bytearray path is used when NumPy is missing
+except ImportError:
+    np = None
+
+SEGMENT_SIZE = 1 << 20  # numbers per task, about 1 MB of flags per worker
+
+_base_primes = []  # filled once per worker by the pool initializer
+
+def base_primes(limit):
+    """Return all primes <= limit with a simple (non segmented) sieve"""
+    if limit < 2:
+        return []
+    flags = bytearray(b"\x01") * (limit + 1)
+    flags[0] = flags[1] = 0
+    for p in range(2, math.isqrt(limit) + 1):
+        if flags[p]:
+            flags[p * p::p] = bytes(len(range(p * p, limit + 1, p)))
+    return [p for p in range(2, limit + 1) if flags[p]]
+
+def _init_sieve_worker(primes):
+    global _base_primes
+    _base_primes = primes
+
+def count_segment(bounds):
+    """Count the primes in [lo, hi) using the base primes of this worker"""
+    lo, hi = bounds
+    lo = max(lo, 2)
+    if lo >= hi:
+        return 0
+    size = hi - lo
+    if np is not None:
+        flags = np.ones(size, dtype=bool)
+    else:
+        flags = bytearray(b"\x01") * size
+    for p in _base_primes:
+        if p * p >= hi:
+            break
+        # first multiple of p inside the segment (never p itself)
+        start = max(p * p, (lo + p - 1) // p * p) - lo
+        if np is not None:
+            flags[start::p] = False
+        else:
+            flags[start::p] = bytes(len(range(start, size, p)))
+    return int(flags.sum()) if np is not None else flags.count(1)
+
+def count_primes_sieve(stop, workers=None, segment_size=SEGMENT_SIZE):
+    """Count the primes below stop, one contiguous segment per task"""
+    primes = base_primes(math.isqrt(max(stop - 1, 0)))
+    segments = [(lo, min(lo + segment_size, stop)) for lo in range(0, stop, segment_size)]
+    if workers == 1 or len(segments) == 1:
+        # not worth starting processes for a single segment
+        _init_sieve_worker(primes)
+        return sum(map(count_segment, segments))
+    with multiprocessing.Pool(processes=workers, initializer=_init_sieve_worker,
+                              initargs=(primes,)) as pool:
+        return sum(pool.imap_unordered(count_segment, segments))
+
+if __name__ == "__main__":
+    # Usage: python Multiproccessing.py [N ...]   e.g. 1000000 100000000 1000000000
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10**6]
+
+    for n in sizes:
+        t = time.perf_counter()
+        num_primes = count_primes_sieve(n)
+        sieve_time = time.perf_counter() - t
+        print(f"sieve    N={n:>13,}: {num_primes} primes in {sieve_time:.3f} s")
+
+        # the is_prime + pool.map version is only practical for small ranges
+        if n <= 10**7:
+            t = time.perf_counter()
+            with multiprocessing.Pool() as pool:
+                num_primes = sum(pool.map(is_prime, range(n)))
+            print(f"pool.map N={n:>13,}: {num_primes} primes in {time.perf_counter() - t:.3f} s")
+        else:
+            print(f"pool.map N={n:>13,}: skipped (too slow)")
+
+"""
+Streaming prime counting
+pool.map builds the whole results list in the parent before sum() runs, so memory grows with N.
+count_primes sends small (lo, hi) chunks instead, adds up the partial counts as they arrive through
+apply_async callbacks, and never keeps more than a few chunks in flight.
+"""
+
+import queue
+
+TARGET_TASK_SECONDS = 0.05  # aim for tasks long enough to hide the IPC cost
+
+def count_range(bounds):
+    """Count the primes in [lo, hi) with the scalar is_prime"""
+    lo, hi = bounds
+    return sum(1 for n in range(lo, hi) if is_prime(n))
+
+def auto_chunksize(start, stop, sample=200):
+    """Pick a chunk size from the measured cost of is_prime at the expensive end of the range"""
+    lo = max(start, stop - sample)
+    t = time.perf_counter()
+    count_range((lo, stop))
+    per_number = (time.perf_counter() - t) / max(stop - lo, 1)
+    if per_number <= 0:
+        return stop - start or 1
+    return max(1, min(int(TARGET_TASK_SECONDS / per_number), stop - start))
+
+def count_primes(start, stop, workers=None, chunksize="auto"):
+    """Count the primes in [start, stop) using flat memory whatever the size of the range"""
+    if stop <= start:
+        return 0
+    if chunksize == "auto":
+        chunksize = auto_chunksize(start, stop)
+    workers = workers or multiprocessing.cpu_count()
+
+    # at most `window` chunks are submitted and not yet counted; results arrive through the
+    # callbacks in completion order. Nothing blocks inside the pool's own threads, so an error
+    # or Ctrl-C in the parent lets the with block terminate the pool right away
+    window = workers * 4
+    results = queue.SimpleQueue()
+
+    def take():
+        partial = results.get()
+        if isinstance(partial, BaseException):
+            raise partial
+        return partial
+
+    total = 0
+    in_flight = 0
+    with multiprocessing.Pool(processes=workers) as pool:
+        for lo in range(start, stop, chunksize):
+            if in_flight == window:
+                total += take()
+                in_flight -= 1
+            pool.apply_async(count_range, ((lo, min(lo + chunksize, stop)),),
+                             callback=results.put, error_callback=results.put)
+            in_flight += 1
+        for _ in range(in_flight):
+            total += take()
+    return total
+
+if __name__ == "__main__":
+    # same output as the pool.map example above
+    num_primes = count_primes(0, 1000000)
+
+    print("Number of prime numbers found:", num_primes)
+
+"""
+Shared memory result buffers
+Every result that comes back from a Pool is pickled and copied into the parent. With a
+multiprocessing.shared_memory block the parent allocates one array up front, each worker writes
+its answers straight into its own slice, and the parent reads them without any copy.
+"""
+
+import concurrent.futures
+from multiprocessing import shared_memory
+
+class SharedResultBuffer:
+    """A fixed size array of bytes (or any struct format) living in shared memory"""
+
+    def __init__(self, length, fmt="B", name=None):
+        self.length = length
+        self.fmt = fmt
+        itemsize = memoryview(bytes(8)).cast(fmt).itemsize
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(length * itemsize, 1))
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+    def __getstate__(self):
+        # only the name travels to the worker, it re-attaches to the same block
+        return {"length": self.length, "fmt": self.fmt, "name": self.shm.name}
+
+    def __setstate__(self, state):
+        self.__init__(state["length"], state["fmt"], state["name"])
+
+    def view(self):
+        """
+        Zero-copy memoryview over the results (a NumPy array when NumPy is available).
+        Drop every view before close(), the segment cannot be closed while one is alive.
+        """
+        if np is not None:
+            return np.ndarray((self.length,), dtype=self.fmt, buffer=self.shm.buf)
+        return self.shm.buf.cast(self.fmt)[:self.length]
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # runs even if a worker crashed, so the segment never outlives the parent
+        self.close()
+
+_result_buffer = None  # attached once per worker by the executor initializer
+
+def _attach_result_buffer(buffer):
+    global _result_buffer
+    _result_buffer = buffer
+
+def fill_is_prime(bounds):
+    """Worker: write is_prime(n) for n in [lo, hi) into the shared buffer, as 1 or 0 of its fmt"""
+    lo, hi = bounds
+    view = _result_buffer.view()
+    if lo < hi:
+        item = type(view[0])  # int, float, bool or the NumPy scalar type of fmt
+        true, false = item(1), item(0)
+        for n in range(lo, hi):
+            view[n] = true if is_prime(n) else false
+    del view  # the worker's own export, released before the next chunk
+    return hi - lo  # only a tiny int is pickled back
+
+def shared_is_prime(stop, workers=None, chunksize=50000, fmt="B"):
+    """
+    is_prime for every n < stop, left in the SharedResultBuffer that is returned.
+    Read it in place with buffer.view() and close the buffer (or use it in a with block) when done.
+    """
+    buffer = SharedResultBuffer(stop, fmt)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_attach_result_buffer,
+                                                    initargs=(buffer,)) as executor:
+            bounds = [(lo, min(lo + chunksize, stop)) for lo in range(0, stop, chunksize)]
+            for _ in executor.map(fill_is_prime, bounds):
+                pass
+    except BaseException:
+        # a crashed worker raises BrokenProcessPool, the segment must not outlive the parent
+        buffer.close()
+        raise
+    return buffer
+
+if __name__ == "__main__":
+    n = 1000000
+
+    t = time.perf_counter()
+    with multiprocessing.Pool() as pool:
+        pickled = pool.map(is_prime, range(n))
+    print(f"pickled results: {sum(pickled)} primes in {time.perf_counter() - t:.3f} s")
+
+    t = time.perf_counter()
+    with shared_is_prime(n) as buffer:
+        view = buffer.view()
+        num_primes = int(view.sum()) if np is not None else sum(view)
+        del view  # release the export before the segment is closed
+    print(f"shared memory  : {num_primes} primes in {time.perf_counter() - t:.3f} s")
+
+"""
+Batched Pipe channel
+sender/receiver above pay one pickle and one system call per message and stop on the magic
+string "END". BatchedSender groups messages into one send_bytes call, bytes payloads are framed
+with a 4 byte length prefix instead of being pickled, and the stream ends with a typed marker.
+"""
+
+import pickle
+import struct
+import threading
+
+_FRAME = struct.Struct("!I")  # length prefix of each bytes payload
+_BYTES_BATCH, _PICKLED_BATCH, _END = b"B", b"P", b"E"
+
+class EndOfStream:
+    """Typed end-of-stream marker, it can never collide with a real message"""
+
+    def __repr__(self):
+        return "END_OF_STREAM"
+
+END_OF_STREAM = EndOfStream()
+
+class BatchedSender:
+    """
+    Buffer messages and send them as one frame once batch_size messages or
+    max_batch_bytes are buffered. A flusher thread sends a partial batch once its
+    oldest message is flush_interval seconds old, so a slow producer does not leave
+    messages sitting in the buffer (flush_interval=None: no thread, flush() by hand).
+    """
+
+    def __init__(self, conn, batch_size=64, flush_interval=0.05, max_batch_bytes=256 * 1024):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_batch_bytes = max_batch_bytes  # big payloads gain nothing from batching
+        self.batch = []
+        self.batch_bytes = 0
+        self.first_buffered = None
+        self.cond = threading.Condition()  # guards the batch and the connection
+        self.flusher = None
+        self.closed = False
+        self.error = None  # a failed background flush, raised by the next send/flush/close
+
+    def _raise_flusher_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def send(self, msg):
+        if isinstance(msg, (bytearray, memoryview)):
+            # copy now: memoryviews cannot be pickled if the batch turns mixed, and the
+            # caller may reuse the buffer before the batch goes out
+            msg = bytes(msg)
+        with self.cond:
+            self._raise_flusher_error()
+            if not self.batch:
+                self.first_buffered = time.monotonic()
+                if self.flush_interval is not None:
+                    if self.flusher is None:
+                        self.flusher = threading.Thread(target=self._flush_on_timeout, daemon=True)
+                        self.flusher.start()
+                    self.cond.notify()
+            self.batch.append(msg)
+            if isinstance(msg, bytes):
+                self.batch_bytes += len(msg)
+            if len(self.batch) >= self.batch_size or self.batch_bytes >= self.max_batch_bytes:
+                self._send_batch()
+
+    def _flush_on_timeout(self):
+        with self.cond:
+            while not self.closed:
+                if not self.batch:
+                    self.cond.wait()
+                    continue
+                remaining = self.first_buffered + self.flush_interval - time.monotonic()
+                if remaining > 0:
+                    self.cond.wait(remaining)
+                    continue
+                try:
+                    self._send_batch()
+                except Exception as exc:
+                    self.error = exc  # keep the thread alive, the producer sees it next
+
+    def flush(self):
+        with self.cond:
+            self._raise_flusher_error()
+            self._send_batch()
+
+    def _send_batch(self):
+        if not self.batch:
+            return
+        batch = self.batch
+        # a batch that cannot be sent is dropped, it must not fail every later flush too
+        self.batch = []
+        self.batch_bytes = 0
+        if all(isinstance(msg, bytes) for msg in batch):
+            parts = [_BYTES_BATCH]
+            for msg in batch:
+                parts.append(_FRAME.pack(len(msg)))
+                parts.append(msg)
+            self.conn.send_bytes(b"".join(parts))
+        else:
+            self.conn.send_bytes(_PICKLED_BATCH + pickle.dumps(batch, pickle.HIGHEST_PROTOCOL))
+
+    def close(self):
+        """Flush what is left, stop the flusher and tell the receiver the stream is over"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+            try:
+                self._raise_flusher_error()
+                self._send_batch()
+            finally:
+                self.conn.send_bytes(_END)
+        if self.flusher is not None:
+            self.flusher.join()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class BatchedReceiver:
+    """Iterate over the messages of a BatchedSender until the end of the stream"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __iter__(self):
+        while True:
+            frame = self.conn.recv_bytes()
+            kind, body = frame[:1], memoryview(frame)[1:]
+            if kind == _END:
+                return
+            if kind == _PICKLED_BATCH:
+                yield from pickle.loads(body)
+                continue
+            offset = 0
+            while offset < len(body):
+                (size,) = _FRAME.unpack_from(body, offset)
+                offset += _FRAME.size
+                yield bytes(body[offset:offset + size])
+                offset += size
+
+def batched_sender(conn, msgs, batch_size=64):
+    with BatchedSender(conn, batch_size) as channel:
+        for msg in msgs:
+            channel.send(msg)
+
+def batched_receiver(conn, expected):
+    received = sum(1 for _ in BatchedReceiver(conn))
+    assert received == expected, (received, expected)
+
+def plain_sender(conn, msgs):
+    for msg in msgs:
+        conn.send(msg)
+    conn.send(END_OF_STREAM)
+    conn.close()
+
+def plain_receiver(conn, expected):
+    received = 0
+    while not isinstance(conn.recv(), EndOfStream):
+        received += 1
+    assert received == expected, (received, expected)
+
+def run_pipe_benchmark(sender_func, receiver_func, msgs):
+    receiving_end, sending_end = multiprocessing.Pipe(duplex=False)
+    p1 = multiprocessing.Process(target=sender_func, args=(sending_end, msgs))
+    p2 = multiprocessing.Process(target=receiver_func, args=(receiving_end, len(msgs)))
+    t = time.perf_counter()
+    p2.start()
+    p1.start()
+    p1.join()
+    p2.join()
+    return time.perf_counter() - t
+
+if __name__ == "__main__":
+    # the first example again, on the batched channel
+    parent_conn, child_conn = multiprocessing.Pipe()
+    with BatchedSender(parent_conn, batch_size=2) as channel:
+        for msg in ["hello", "hey", "hru?"]:
+            channel.send(msg)
+    for msg in BatchedReceiver(child_conn):
+        print("Received the message: {}".format(msg))
+
+    # messages/sec and MB/sec across payload sizes
+    for size in (16, 1024, 64 * 1024):
+        count = max(200, (64 * 1024 * 1024) // (size * 16))
+        msgs = [bytes(size)] * count
+        for name, send_func, recv_func in (("send/recv", plain_sender, plain_receiver),
+                                           ("batched  ", batched_sender, batched_receiver)):
+            elapsed = run_pipe_benchmark(send_func, recv_func, msgs)
+            print(f"{name} {size:>6} B x {count:>7}: {count / elapsed:>10,.0f} msg/s "
+                  f"{count * size / elapsed / 1e6:>8.1f} MB/s")
+
+"""
+Persistent worker pool service
+calc_square and calc_cube above start a brand new Process for one job, and the prime example
+builds and tears down a Pool on every run. WorkerPoolService keeps warm workers alive, routes
+named tasks to them, recycles a worker after max_tasks jobs to cap memory growth, restarts dead
+workers and records startup and task latency histograms.
+"""
+
+import importlib
+import itertools
+import queue
+import threading
+
+def square(n):
+    return n * n
+
+def cube(n):
+    return n * n * n
+
+# named task routing: the name travels to the worker, never the function
+TASK_ROUTES = {
+    "square": square,
+    "cube": cube,
+    "is_prime": is_prime,
+    "count_range": count_range,
+}
+
+class LatencyHistogram:
+    """Power-of-two buckets in microseconds, cheap enough to record every task"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        bucket = max(int(seconds * 1e6), 1).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """Upper bound (in seconds) of the bucket holding the p-th percentile"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        return (f"n={self.count} p50={self.percentile(50) * 1e3:.3f}ms "
+                f"p99={self.percentile(99) * 1e3:.3f}ms max={self.max * 1e3:.3f}ms")
+
+def _service_worker(worker_id, tasks, results, max_tasks, preload):
+    for module in preload:
+        importlib.import_module(module)  # pay the import cost before the first job
+    results.put(("ready", worker_id, None, None))
+    for _ in range(max_tasks) if max_tasks else itertools.count():
+        job = tasks.get()
+        if job is None:
+            return
+        job_id, name, args = job
+        t = time.perf_counter()
+        try:
+            value, ok = TASK_ROUTES[name](*args), True
+        except Exception as exc:
+            value, ok = exc, False
+        results.put(("done", worker_id, job_id, (ok, value, time.perf_counter() - t)))
+    results.put(("retired", worker_id, None, None))
+
+class WorkerPoolService:
+    """Long lived pool of warm processes with named task routing"""
+
+    def __init__(self, workers=None, max_tasks=1000, preload=(), health_interval=0.5):
+        self.size = workers or multiprocessing.cpu_count()
+        self.max_tasks = max_tasks
+        self.preload = tuple(preload)
+        self.health_interval = health_interval
+        self.results = multiprocessing.Queue()
+        self.workers = {}     # worker_id -> (process, task queue, start time)
+        self.in_flight = {}   # worker_id -> {job_id: Future}
+        self.ready = set()
+        self.startup_latency = LatencyHistogram()
+        self.task_latency = LatencyHistogram()
+        self.restarts = 0
+        self.lock = threading.Lock()
+        self.worker_ids = itertools.count()
+        self.job_ids = itertools.count()
+        self.running = True
+        for _ in range(self.size):
+            self._spawn()
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+
+    def _spawn(self):
+        worker_id = next(self.worker_ids)
+        tasks = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_service_worker,
+            args=(worker_id, tasks, self.results, self.max_tasks, self.preload),
+            daemon=True)
+        self.workers[worker_id] = (process, tasks, time.perf_counter())
+        self.in_flight[worker_id] = {}
+        process.start()
+
+    def submit(self, name, *args):
+        """Run TASK_ROUTES[name](*args) on the least busy worker and return a Future"""
+        if name not in TASK_ROUTES:
+            raise ValueError("Invalid task name: {}".format(name))
+        future = concurrent.futures.Future()
+        with self.lock:
+            if not self.running:
+                raise RuntimeError("service is shut down")
+            job_id = next(self.job_ids)
+            worker_id = min(self.in_flight, key=lambda w: len(self.in_flight[w]))
+            self.in_flight[worker_id][job_id] = future
+            self.workers[worker_id][1].put((job_id, name, args))
+        return future
+
+    def map(self, name, iterable):
+        futures = [self.submit(name, item) for item in iterable]
+        return [future.result() for future in futures]
+
+    def _retire(self, worker_id, error=None):
+        """
+        Forget a worker; jobs it never ran go to the others, or fail if it died mid-job.
+        Returns the (future, exception) pairs to fail once self.lock is released.
+        """
+        if worker_id not in self.workers:
+            return []
+        process, tasks, _ = self.workers.pop(worker_id)
+        pending = self.in_flight.pop(worker_id)
+        self.ready.discard(worker_id)
+        if self.running:
+            self.restarts += 1
+            self._spawn()
+        elif error is None:
+            error = RuntimeError("service is shut down")
+        if error is not None:
+            return [(future, error) for future in pending.values()]
+        for job_id, future in pending.items():
+            # a retired worker exits after its quota, its queued jobs are moved
+            job = tasks.get()
+            worker = min(self.in_flight, key=lambda w: len(self.in_flight[w]))
+            self.in_flight[worker][job_id] = future
+            self.workers[worker][1].put(job)
+        return []
+
+    def _collect(self):
+        while True:
+            try:
+                kind, worker_id, job_id, payload = self.results.get(timeout=self.health_interval)
+            except queue.Empty:
+                kind = None
+            # futures are completed after the lock is released: done-callbacks run inline
+            # and may call submit()
+            completed = []  # (future, ok, value)
+            failed = []     # (future, exception) from _retire
+            stop = False
+            with self.lock:
+                if kind == "ready" and worker_id in self.workers:
+                    self.ready.add(worker_id)
+                    self.startup_latency.record(time.perf_counter() - self.workers[worker_id][2])
+                elif kind == "done":
+                    ok, value, elapsed = payload
+                    self.task_latency.record(elapsed)
+                    # None when the health check already failed the job of a retired worker
+                    future = self.in_flight.get(worker_id, {}).pop(job_id, None)
+                    if future is not None:
+                        completed.append((future, ok, value))
+                elif kind == "retired" and worker_id in self.workers:
+                    self.workers[worker_id][0].join()
+                    failed += self._retire(worker_id)
+                # health check: a worker that died without saying goodbye
+                for worker_id, (process, _, _) in list(self.workers.items()):
+                    if not process.is_alive() and process.exitcode not in (None, 0):
+                        failed += self._retire(worker_id, RuntimeError(
+                            "worker {} died with exit code {}".format(worker_id, process.exitcode)))
+                # stop once every worker has exited and the results queue is drained
+                if not self.running and kind is None and not any(
+                        process.is_alive() for process, _, _ in self.workers.values()):
+                    for worker_id in list(self.workers):
+                        failed += self._retire(worker_id)
+                    stop = True
+            completed += [(future, False, error) for future, error in failed]
+            for future, ok, value in completed:
+                future.set_result(value) if ok else future.set_exception(value)
+            if stop:
+                return
+
+    def health(self):
+        with self.lock:
+            return {worker_id: {"pid": process.pid, "alive": process.is_alive(),
+                                "ready": worker_id in self.ready,
+                                "in_flight": len(self.in_flight[worker_id])}
+                    for worker_id, (process, _, _) in self.workers.items()}
+
+    def shutdown(self):
+        """Let the workers finish their queued jobs, then fail whatever is still pending"""
+        with self.lock:
+            stopping, self.running = self.running, False
+            workers = list(self.workers.values())
+            if stopping:
+                for _, tasks, _ in workers:
+                    tasks.put(None)
+        for process, _, _ in workers:
+            process.join()
+        self.collector.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+if __name__ == "__main__":
+    with WorkerPoolService(workers=2, max_tasks=100, preload=("json",)) as service:
+        arr = [2, 3, 8]
+        print("square", service.map("square", arr))
+        print("cube  ", service.map("cube", arr))
+
+        t = time.perf_counter()
+        num_primes = sum(service.map("count_range", [(lo, lo + 50000) for lo in range(0, 1000000, 50000)]))
+        print("Number of prime numbers found:", num_primes, "in", time.perf_counter() - t)
+
+        print("health          :", service.health())
+        print("worker restarts :", service.restarts)
+        print("startup latency :", service.startup_latency.summary())
+        print("task latency    :", service.task_latency.summary())
+
+"""
+Vectorized square and cube
+calc_square and calc_cube loop in Python, print every value and sleep. For big arrays
+calc_powers computes both in one NumPy pass, falls back to Python ints (dtype=object) when a cube
+could overflow int64, and write_powers prints everything with one buffered write.
+"""
+
+import io
+
+INT64_CUBE_LIMIT = 2097151  # largest n with n**3 < 2**63
+
+def calc_powers_scalar(numbers):
+    """Reference version: the loop of calc_square/calc_cube without the print and sleep"""
+    return [n * n for n in numbers], [n * n * n for n in numbers]
+
+def calc_powers(numbers):
+    """Return (squares, cubes) of numbers, as NumPy arrays when NumPy is available"""
+    if np is None:
+        return calc_powers_scalar(numbers)
+    arr = np.asarray(numbers)
+    if arr.dtype.kind in "iu":
+        if arr.size and (arr.min() < -INT64_CUBE_LIMIT or arr.max() > INT64_CUBE_LIMIT):
+            arr = arr.astype(object)  # exact, but back to Python speed
+        else:
+            arr = arr.astype(np.int64, copy=False)
+    squares = arr * arr
+    return squares, squares * arr
+
+def write_powers(squares, cubes, out=None):
+    """Print all the results with a single write instead of one print per value"""
+    out = out or sys.stdout
+    buffer = io.StringIO()
+    for name, values in (("square", squares), ("cube", cubes)):
+        values = values.tolist() if hasattr(values, "tolist") else values
+        buffer.write("".join("{} {}\n".format(name, v) for v in values))
+    out.write(buffer.getvalue())
+    out.flush()
+
+def _powers_chunk(chunk):
+    return calc_powers(chunk)
+
+def calc_powers_split(numbers, workers=None):
+    """calc_powers over one chunk per process, to see where processes stop paying off"""
+    workers = workers or multiprocessing.cpu_count()
+    step = -(-len(numbers) // workers) or 1
+    chunks = [numbers[i:i + step] for i in range(0, len(numbers), step)]
+    with multiprocessing.Pool(processes=workers) as pool:
+        parts = pool.map(_powers_chunk, chunks)
+    if np is None:
+        return ([v for sq, _ in parts for v in sq], [v for _, cu in parts for v in cu])
+    return np.concatenate([sq for sq, _ in parts]), np.concatenate([cu for _, cu in parts])
+
+if __name__ == "__main__":
+    arr = [2, 3, 8]
+    write_powers(*calc_powers(arr))
+    write_powers(*calc_powers([2**40, -3]))  # too big for int64 cubes, exact anyway
+
+    for n in (10**3, 10**5, 10**6, 10**7):
+        numbers = np.arange(n) if np is not None else list(range(n))
+        timings = []
+        for func in (calc_powers_scalar, calc_powers, calc_powers_split):
+            t = time.perf_counter()
+            func(numbers)
+            timings.append(time.perf_counter() - t)
+        print("N={:>10,}: scalar {:.4f} s | vectorized {:.4f} s | split over processes {:.4f} s".format(n, *timings))
+
+"""
+Work stealing scheduler
+is_prime gets slower as n grows, so a static split of the range leaves the workers holding the
+small numbers idle while the last one is still busy. Here every worker owns a deque of chunks
+(a [head, tail) window of task indexes in shared memory); it pops from its own head and, once it
+runs dry, steals half of the tail of the busiest worker.
+"""
+
+def _steal(me, windows, locks):
+    """Move half of the fullest deque into ours and return its first task, None once all are empty"""
+    workers = len(locks)
+    while True:
+        # unlocked peek to order the victims, fullest first; each lock below re-checks
+        for victim in sorted(range(workers), key=lambda w: windows[2 * w] - windows[2 * w + 1]):
+            with locks[victim]:
+                head, tail = windows[2 * victim], windows[2 * victim + 1]
+                take = (tail - head + 1) // 2
+                if take <= 0:
+                    continue  # drained since the peek, try the next one
+                windows[2 * victim + 1] = tail - take
+            with locks[me]:
+                windows[2 * me], windows[2 * me + 1] = tail - take + 1, tail
+            return tail - take
+        # every deque looked empty; look once more in case a steal was moving work around
+        if not any(windows[2 * w] < windows[2 * w + 1] for w in range(workers)):
+            return None
+
+def _stealing_worker(me, windows, locks, chunks, start_time, stats):
+    busy = 0.0
+    tasks = steals = total = 0
+    while True:
+        task = None
+        with locks[me]:
+            head, tail = windows[2 * me], windows[2 * me + 1]
+            if head < tail:
+                task = head
+                windows[2 * me] = head + 1
+        if task is None:
+            task = _steal(me, windows, locks)
+            if task is None:
+                break  # every deque is empty, nothing left to do
+            steals += 1
+        t = time.perf_counter()
+        total += count_range(chunks[task])
+        busy += time.perf_counter() - t
+        tasks += 1
+    elapsed = time.monotonic() - start_time
+    stats.put({"worker": me, "primes": total, "tasks": tasks, "steals": steals,
+               "busy": busy, "finished": elapsed, "utilization": busy / elapsed if elapsed else 1.0})
+
+def _timed_slice(bounds):
+    """count_range for the pool.map baseline, with which process finished it and when"""
+    return count_range(bounds), multiprocessing.current_process().name, time.monotonic()
+
+def count_primes_stealing(start, stop, workers=None, chunksize=10000):
+    """Count the primes in [start, stop) with work stealing, return (count, per-worker stats)"""
+    workers = workers or multiprocessing.cpu_count()
+    chunks = [(lo, min(lo + chunksize, stop)) for lo in range(start, stop, chunksize)]
+    windows = multiprocessing.Array("q", 2 * workers, lock=False)
+    # same static split as pool.map to begin with: worker i owns the i-th slice of the chunks
+    per_worker = -(-len(chunks) // workers) if chunks else 0
+    for w in range(workers):
+        windows[2 * w] = min(w * per_worker, len(chunks))
+        windows[2 * w + 1] = min((w + 1) * per_worker, len(chunks))
+    locks = [multiprocessing.Lock() for _ in range(workers)]
+    stats = multiprocessing.Queue()
+    start_time = time.monotonic()
+    processes = [multiprocessing.Process(target=_stealing_worker,
+                                         args=(w, windows, locks, chunks, start_time, stats))
+                 for w in range(workers)]
+    for p in processes:
+        p.start()
+    results = sorted((stats.get() for _ in processes), key=lambda s: s["worker"])
+    for p in processes:
+        p.join()
+    return sum(s["primes"] for s in results), results
+
+if __name__ == "__main__":
+    stop = 5000000
+    workers = multiprocessing.cpu_count()
+
+    t = time.perf_counter()
+    with multiprocessing.Pool(processes=workers) as pool:
+        # one static slice per worker, the last slices hold the most expensive numbers
+        start_time = time.monotonic()
+        size = -(-stop // workers)
+        slices = [(lo, min(lo + size, stop)) for lo in range(0, stop, size)]
+        results = pool.map(_timed_slice, slices, chunksize=1)
+    print(f"pool.map      : {sum(r[0] for r in results)} primes in {time.perf_counter() - t:.3f} s")
+    finished = {}
+    for _, worker, done in results:
+        finished[worker] = max(finished.get(worker, 0.0), done - start_time)
+    print(f"tail (last worker done - first worker done): "
+          f"{max(finished.values()) - min(finished.values()):.3f} s")
+    for worker, done in sorted(finished.items()):
+        print(f"{worker}: finished at {done:.3f} s")
+
+    t = time.perf_counter()
+    num_primes, stats = count_primes_stealing(0, stop, workers)
+    print(f"work stealing : {num_primes} primes in {time.perf_counter() - t:.3f} s")
+    finished = [s["finished"] for s in stats]
+    print(f"tail (last worker done - first worker done): {max(finished) - min(finished):.3f} s")
+    for s in stats:
+        print("worker {worker}: finished at {finished:.3f} s, {tasks} tasks, {steals} steals, "
+              "utilization {utilization:.0%}".format(**s))
@@ -189,3 +189,461 @@ if __name__ == "__main__":
 
     # Print the final value of the counter
     print("Final Counter Value:", counter)
+
+"""Vectorized square and cube"""
+# calc_square and calc_cube above print every value and sleep to simulate I/O.
+# For real arrays there is nothing to wait for: compute everything in one pass
+# and, if output is wanted, write it with one call instead of one print per value.
+
+import sys
+import time
+
+try:
+    import numpy as np  # optional
+except ImportError:
+    np = None
+
+INT64_CUBE_LIMIT = 2097151  # largest n with n**3 < 2**63
+
+def calc_square_cube(numbers, verbose=False):
+    if np is None:
+        squares = [n * n for n in numbers]
+        cubes = [n * s for n, s in zip(numbers, squares)]
+    else:
+        arr = np.asarray(numbers)
+        if arr.dtype.kind in "iu":
+            overflow = arr.size and (arr.min() < -INT64_CUBE_LIMIT or arr.max() > INT64_CUBE_LIMIT)
+            arr = arr.astype(object if overflow else np.int64)  # object = exact Python ints
+        squares = arr * arr
+        cubes = squares * arr
+    if verbose:
+        lines = ["square: {}\n".format(v) for v in squares]
+        lines += ["cube: {}\n".format(v) for v in cubes]
+        sys.stdout.write("".join(lines))
+    return squares, cubes
+
+if __name__ == "__main__":
+    t = time.time()
+    calc_square_cube([2, 3, 8, 9], verbose=True)
+    print("done in : ", time.time() - t)
+
+    t = time.time()
+    squares, cubes = calc_square_cube(range(1000000))
+    print("1,000,000 squares and cubes done in : ", time.time() - t)
+
+"""Sharded counter"""
+# increment_counter above takes one global lock for every +1, so all threads queue on it.
+# ShardedCounter gives every thread its own cell: add() only touches the calling thread's
+# cell and value() sums the cells. Only registering a new thread takes the lock, and a
+# cell is only ever written by its own thread, so the total stays exact.
+
+import threading
+import time
+import multiprocessing
+
+class ShardedCounter:
+    def __init__(self):
+        self._local = threading.local()
+        self._cells = []            # one [count] list per thread that has called add()
+        self._lock = threading.Lock()
+
+    def add(self, n=1):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0]
+            with self._lock:
+                self._cells.append(cell)
+        cell[0] += n
+
+    def value(self):
+        with self._lock:
+            return sum(cell[0] for cell in self._cells)
+
+class SharedCounter:
+    """Counter for processes: each process counts locally and add()s the batch to a shared Value"""
+
+    def __init__(self):
+        self._value = multiprocessing.Value("q", 0)  # comes with its own lock
+
+    def add(self, n=1):
+        with self._value.get_lock():
+            self._value.value += n
+
+    def value(self):
+        return self._value.value
+
+def lock_per_increment(lock, times):
+    global counter
+    for _ in range(times):
+        with lock:
+            counter += 1
+
+def sharded_increment(sharded, times):
+    for _ in range(times):
+        sharded.add()
+
+def batched_increment(shared, times):
+    local = 0
+    for _ in range(times):
+        local += 1
+    shared.add(local)  # one locked update per process instead of one per increment
+
+def run_threads(target, args, num_threads):
+    threads = [threading.Thread(target=target, args=args) for _ in range(num_threads)]
+    t = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - t
+
+if __name__ == "__main__":
+    total = 640000
+    for num_threads in (2, 8, 64):
+        per_thread = total // num_threads
+
+        counter = 0
+        locked_time = run_threads(lock_per_increment, (threading.Lock(), per_thread), num_threads)
+
+        sharded = ShardedCounter()
+        sharded_time = run_threads(sharded_increment, (sharded, per_thread), num_threads)
+
+        print("{:>2} threads | lock per increment: {} in {:.3f} s | sharded: {} in {:.3f} s".format(
+            num_threads, counter, locked_time, sharded.value(), sharded_time))
+
+    shared = SharedCounter()
+    processes = [multiprocessing.Process(target=batched_increment, args=(shared, 100000)) for _ in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    print("Shared counter across 4 processes:", shared.value())
+
+"""Example: asyncio URL fetcher with connection pooling"""
+# fetch_url above starts one OS thread per URL and requests.get opens a new TCP
+# connection every time. AsyncFetcher runs every request on one event loop:
+# a semaphore bounds the requests in flight, HTTP/1.1 keep-alive connections are
+# pooled per host, each request has a timeout and is retried with exponential
+# backoff, and the body is read in chunks so it can be streamed to a callback.
+
+import asyncio
+import http.server
+import ssl
+import threading
+import time
+import urllib.parse
+import weakref
+
+class FetchResult:
+    def __init__(self, url, status=None, body=b"", elapsed=0.0, error=None):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.elapsed = elapsed
+        self.error = error
+
+    def __repr__(self):
+        return "FetchResult({!r}, status={}, {} bytes, {:.3f} s, error={!r})".format(
+            self.url, self.status, len(self.body), self.elapsed, self.error)
+
+class AsyncFetcher:
+    # streams and semaphores belong to the event loop they were made on, so a fetcher
+    # used by several asyncio.run() calls keeps its limits per loop and never hands a
+    # request a connection from another loop
+
+    def __init__(self, max_concurrency=100, per_host=10, timeout=10.0, retries=2, backoff=0.1):
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.idle = {}    # (scheme, host, port) -> idle (loop, reader, writer)
+        self.limits = weakref.WeakKeyDictionary()  # loop -> (Semaphore, {key: Semaphore(per_host)})
+
+    def _limits(self):
+        loop = asyncio.get_running_loop()
+        limits = self.limits.get(loop)
+        if limits is None:
+            limits = self.limits[loop] = (asyncio.Semaphore(self.max_concurrency), {})
+        return limits
+
+    async def fetch(self, url, on_chunk=None):
+        """GET url; the body is passed chunk by chunk to on_chunk, or kept in result.body"""
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        semaphore, host_slots = self._limits()
+        slots = host_slots.setdefault(key, asyncio.Semaphore(self.per_host))
+        t = time.perf_counter()
+        async with semaphore, slots:
+            delivered = []  # chunks already handed to on_chunk, over all attempts
+            for attempt in range(self.retries + 1):
+                streamed = []
+                if on_chunk is None:
+                    sink = streamed.append
+                else:
+                    def sink(chunk):
+                        delivered.append(len(chunk))
+                        on_chunk(chunk)
+                try:
+                    status = await asyncio.wait_for(self._request(key, path, sink), self.timeout)
+                    return FetchResult(url, status, b"".join(streamed), time.perf_counter() - t)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+                    # a streamed body cannot be taken back, so only retry clean failures
+                    if attempt == self.retries or delivered:
+                        return FetchResult(url, error=exc, elapsed=time.perf_counter() - t)
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def fetch_all(self, urls, on_chunk=None):
+        """Async iterator over the results, in completion order"""
+        tasks = [asyncio.ensure_future(self.fetch(url, on_chunk)) for url in urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _connection(self, key):
+        loop = asyncio.get_running_loop()
+        idle = self.idle.setdefault(key, [])
+        while idle:
+            owner, reader, writer = idle.pop()
+            if owner is loop and not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            self._discard(owner, writer)
+        scheme, host, port = key
+        context = ssl.create_default_context() if scheme == "https" else None
+        return await asyncio.open_connection(host, port, ssl=context)
+
+    async def _request(self, key, path, sink):
+        reader, writer = await self._connection(key)
+        reusable = False
+        try:
+            writer.write("GET {} HTTP/1.1\r\nHost: {}\r\nConnection: keep-alive\r\n\r\n"
+                         .format(path, key[1]).encode("latin-1"))
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError("server closed the connection")
+            version, status = status_line.split(None, 2)[:2]
+            status = int(status)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if status in (204, 304) or 100 <= status < 200:
+                pass
+            elif headers.get("transfer-encoding", "").lower() == "chunked":
+                while True:
+                    size = int((await reader.readline()).split(b";")[0], 16)
+                    if size == 0:
+                        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                            pass  # trailers
+                        break
+                    await self._read_body(reader, size, sink)
+                    await reader.readexactly(2)
+            elif "content-length" in headers:
+                await self._read_body(reader, int(headers["content-length"]), sink)
+            else:
+                while chunk := await reader.read(65536):  # body ends when the server closes
+                    sink(chunk)
+                return status
+            reusable = (headers.get("connection", "").lower() != "close"
+                        and (version == b"HTTP/1.1" or headers.get("connection", "").lower() == "keep-alive"))
+            return status
+        finally:
+            if reusable:
+                self.idle.setdefault(key, []).append((asyncio.get_running_loop(), reader, writer))
+            else:
+                writer.close()
+
+    @staticmethod
+    async def _read_body(reader, length, sink):
+        while length:
+            chunk = await reader.read(min(length, 65536))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b"", length)
+            sink(chunk)
+            length -= len(chunk)
+
+    @staticmethod
+    def _discard(owner, writer):
+        """Close a connection from any thread; one from a closed loop can only be dropped"""
+        if owner.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if owner is running:
+            writer.close()
+        else:
+            owner.call_soon_threadsafe(writer.close)
+
+    def close(self):
+        for connections in self.idle.values():
+            for owner, _, writer in connections:
+                self._discard(owner, writer)
+        self.idle.clear()
+
+# a local HTTP server standing in for the real sites
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are two writes
+    body = b"x" * 1024
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stand_in_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def p99(latencies):
+    latencies = sorted(latencies)
+    return latencies[int(0.99 * (len(latencies) - 1))] if latencies else 0.0
+
+async def fetch_async(urls):
+    fetcher = AsyncFetcher(max_concurrency=50)
+    try:
+        return [result async for result in fetcher.fetch_all(urls)]
+    finally:
+        fetcher.close()
+
+def check_fetcher(server):
+    """Self-check against the stand-in server: streaming, errors, reuse across loops"""
+    base = "http://127.0.0.1:{}".format(server.server_port)
+    fetcher = AsyncFetcher(max_concurrency=4, per_host=2, retries=0)
+
+    async def run(urls, on_chunk=None):
+        return [result async for result in fetcher.fetch_all(urls, on_chunk)]
+
+    results = asyncio.run(run(["{}/a/{}".format(base, i) for i in range(20)]))
+    assert all(r.status == 200 and r.body == StandInHandler.body for r in results), results
+    # a second event loop must open new connections, not reuse the closed loop's ones
+    results = asyncio.run(run(["{}/b/{}".format(base, i) for i in range(20)]))
+    assert all(r.error is None for r in results), results
+    chunks = []
+    results = asyncio.run(run([base + "/streamed"], chunks.append))
+    assert results[0].body == b"" and b"".join(chunks) == StandInHandler.body
+    results = asyncio.run(run(["http://127.0.0.1:1/refused"]))
+    assert isinstance(results[0].error, OSError), results
+    fetcher.close()
+
+def fetch_thread_per_url(urls):
+    latencies = []
+
+    def fetch(url):
+        t = time.perf_counter()
+        requests.get(url)
+        latencies.append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=fetch, args=(url,)) for url in urls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+if __name__ == "__main__":
+    server = start_stand_in_server()
+    urls = ["http://127.0.0.1:{}/item/{}".format(server.server_port, i) for i in range(500)]
+    check_fetcher(server)
+
+    t = time.perf_counter()
+    results = asyncio.run(fetch_async(urls))
+    elapsed = time.perf_counter() - t
+    print("asyncio       : {:.0f} req/s, p99 {:.1f} ms, {} errors".format(
+        len(urls) / elapsed, p99([r.elapsed for r in results]) * 1e3, sum(r.error is not None for r in results)))
+
+    t = time.perf_counter()
+    latencies = fetch_thread_per_url(urls)
+    elapsed = time.perf_counter() - t
+    print("thread per URL: {:.0f} req/s, p99 {:.1f} ms".format(len(urls) / elapsed, p99(latencies) * 1e3))
+
+    server.shutdown()
+
+"""Example: bulk fetch with a pool of requests.Session objects"""
+# The threaded fetch_url uses a bare requests.get, so every call sets up DNS,
+# TCP and TLS again, and the example starts one thread per URL. fetch_many runs
+# on a fixed ThreadPoolExecutor, borrows a Session (with its keep-alive
+# connection pool) for each request, and only pulls the next URL from the
+# iterator when fewer than max_in_flight requests are pending.
+
+import concurrent.futures
+import itertools
+import queue
+import time
+
+from requests.adapters import HTTPAdapter
+
+class SessionPool:
+    """Thread-safe pool of requests.Session objects sharing one HTTPAdapter configuration"""
+
+    def __init__(self, size, pool_connections=10, pool_maxsize=10):
+        self.sessions = queue.LifoQueue()
+        for _ in range(size):
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.sessions.put(session)
+
+    def get(self, url, **kwargs):
+        session = self.sessions.get()  # a Session is only used by one thread at a time
+        try:
+            return session.get(url, **kwargs)
+        finally:
+            self.sessions.put(session)
+
+    def close(self):
+        while not self.sessions.empty():
+            self.sessions.get_nowait().close()
+
+def fetch_many(urls, max_workers=16, max_in_flight=64, timeout=10, pool_maxsize=10):
+    """Yield (url, status code or None, error or None) in completion order"""
+    sessions = SessionPool(max_workers, pool_maxsize=pool_maxsize)
+
+    def fetch(url):
+        try:
+            return url, sessions.get(url, timeout=timeout).status_code, None
+        except requests.RequestException as exc:
+            return url, None, exc
+
+    urls = iter(urls)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {executor.submit(fetch, url) for url in itertools.islice(urls, max_in_flight)}
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+                for url in itertools.islice(urls, len(done)):
+                    pending.add(executor.submit(fetch, url))
+    finally:
+        sessions.close()
+
+if __name__ == "__main__":
+    server = start_stand_in_server()
+    urls = ("http://127.0.0.1:{}/item/{}".format(server.server_port, i) for i in range(2000))
+
+    t = time.perf_counter()
+    statuses = [status for url, status, error in fetch_many(urls)]
+    elapsed = time.perf_counter() - t
+    print("pooled sessions: {:.0f} req/s, {} OK".format(len(statuses) / elapsed, statuses.count(200)))
+
+    server.shutdown()
@@ -4,6 +4,8 @@ import socket
 def start_server():
     # Create a socket object
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Allow a restart while old connections are still in TIME_WAIT
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     
     # Get local machine name
     host = socket.gethostname()
@@ -34,9 +36,6 @@ def start_server():
         # Close the connection
         client_socket.close()
 
-if __name__ == "__main__":
-    start_server()
-
 #Client
 import socket
 
@@ -62,7 +61,786 @@ def start_client():
     # Close the connection
     client_socket.close()
 
-if __name__ == "__main__":
-    start_client()
-
  
+
+#Concurrent Server
+import errno
+import selectors
+import socket
+import sys
+import threading
+import time
+
+def start_concurrent_server(host="127.0.0.1", port=9999, backlog=1024, ready=None):
+    """
+    start_server handles one client at a time, so one slow client stalls everyone behind it.
+    This server registers every socket with a selector (epoll on Linux) and serves thousands
+    of connections from one thread: nothing blocks, each socket is only touched when it is ready.
+    """
+    sel = selectors.DefaultSelector()
+
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((host, port))
+    server_socket.listen(backlog)  # a large backlog absorbs bursts of new connections
+    server_socket.setblocking(False)
+    sel.register(server_socket, selectors.EVENT_READ, None)
+
+    print(f"Concurrent server started at {host} on port {port}.")
+    if ready is not None:
+        ready.set()
+
+    response = "Thank you for connecting".encode('utf-8')
+    pending = {}  # client socket -> bytes still to send
+    resume_accept = None  # set while accepting is paused for lack of file descriptors
+
+    while True:
+        timeout = None
+        if resume_accept is not None:
+            timeout = resume_accept - time.monotonic()
+            if timeout <= 0:
+                sel.register(server_socket, selectors.EVENT_READ, None)
+                resume_accept = timeout = None
+        for key, events in sel.select(timeout):
+            if key.data is None:
+                # new connections: accept everything waiting in the backlog
+                while True:
+                    try:
+                        client_socket, addr = server_socket.accept()
+                    except BlockingIOError:
+                        break
+                    except OSError as exc:
+                        if exc.errno in (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM):
+                            # out of descriptors: the listener would stay readable and spin,
+                            # so stop watching it for a moment while open clients finish
+                            sel.unregister(server_socket)
+                            resume_accept = time.monotonic() + 0.05
+                            break
+                        continue  # e.g. ECONNABORTED: that client is gone, take the next one
+                    client_socket.setblocking(False)
+                    sel.register(client_socket, selectors.EVENT_READ, "read")
+                continue
+
+            client_socket = key.fileobj
+            if events & selectors.EVENT_READ:
+                try:
+                    data = client_socket.recv(1024)
+                except ConnectionError:
+                    data = b""
+                sel.unregister(client_socket)
+                if not data:
+                    client_socket.close()
+                    continue
+                pending[client_socket] = response
+                sel.register(client_socket, selectors.EVENT_WRITE, "write")
+            elif events & selectors.EVENT_WRITE:
+                try:
+                    sent = client_socket.send(pending[client_socket])
+                except ConnectionError:
+                    sent = len(pending[client_socket])
+                pending[client_socket] = pending[client_socket][sent:]
+                if not pending[client_socket]:
+                    del pending[client_socket]
+                    sel.unregister(client_socket)
+                    client_socket.close()
+
+def load_generator(host="127.0.0.1", port=9999, connections=2000, concurrency=500, timeout=5.0):
+    """Open `connections` connections, `concurrency` at a time, and time each request"""
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    remaining = iter(range(connections))
+
+    def client():
+        for _ in remaining:
+            t = time.perf_counter()
+            try:
+                with socket.create_connection((host, port), timeout=timeout) as client_socket:
+                    client_socket.sendall("Hello, Server!".encode('utf-8'))
+                    if not client_socket.recv(1024):
+                        raise ConnectionError("closed without a response")
+            except OSError as exc:  # refused, reset or timed out
+                with lock:
+                    failures.append(exc)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    t = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - t
+
+    if not latencies:
+        print(f"no successful connections, {len(failures)} failed")
+        return
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(0.99 * (len(latencies) - 1))]
+    print(f"{len(latencies) / elapsed:.0f} connections/sec, p50 {p50 * 1e3:.2f} ms, p99 {p99 * 1e3:.2f} ms, "
+          f"{len(failures)} failed")
+
+def bench_concurrent_server():
+    # run the concurrent server in the background and load it
+    ready = threading.Event()
+    threading.Thread(target=start_concurrent_server, kwargs={"port": 9998, "ready": ready}, daemon=True).start()
+    ready.wait()
+    load_generator(port=9998)
+
+#Framed protocol with persistent connections
+import collections
+import struct
+
+HEADER = struct.Struct("!I")  # every frame starts with its length as 4 bytes, big endian
+
+def send_frame(sock, payload):
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+class FrameReader:
+    """
+    A single recv(1024) only returns what has arrived so far, so bigger messages get cut.
+    FrameReader keeps calling recv_into on one reusable buffer until a whole frame is there.
+    A header announcing more than max_frame bytes is refused instead of allocated.
+    """
+
+    def __init__(self, sock, bufsize=64 * 1024, max_frame=16 * 1024 * 1024):
+        self.sock = sock
+        self.max_frame = max_frame
+        self.buffer = bytearray(bufsize)
+        self.start = 0  # first unread byte
+        self.end = 0    # end of received data
+
+    def _fill(self, needed):
+        """Make sure at least `needed` unread bytes are in the buffer"""
+        while self.end - self.start < needed:
+            if self.start + needed > len(self.buffer):
+                # move the unread bytes to the front, grow only for frames bigger than the buffer
+                unread = self.buffer[self.start:self.end]
+                if needed > len(self.buffer):
+                    self.buffer = bytearray(needed)
+                self.buffer[:len(unread)] = unread
+                self.start, self.end = 0, len(unread)
+            received = self.sock.recv_into(memoryview(self.buffer)[self.end:])
+            if not received:
+                if self.end == self.start:
+                    return False
+                raise ConnectionError("connection closed in the middle of a frame")
+            self.end += received
+        return True
+
+    def read_frame(self):
+        """Return the next payload, or None when the peer closed the connection"""
+        if not self._fill(HEADER.size):
+            return None
+        (length,) = HEADER.unpack_from(self.buffer, self.start)
+        if length > self.max_frame:
+            raise ConnectionError("frame of {} bytes is over the {} byte limit".format(length, self.max_frame))
+        self.start += HEADER.size
+        if not self._fill(length):
+            # a clean EOF is only fine between frames, never after a header
+            raise ConnectionError("connection closed in the middle of a frame")
+        payload = bytes(self.buffer[self.start:self.start + length])
+        self.start += length
+        return payload
+
+def serve_framed_connection(client_socket, handler):
+    # keep-alive: answer frames until the client closes the connection
+    reader = FrameReader(client_socket)
+    with client_socket:
+        try:
+            while (request := reader.read_frame()) is not None:
+                send_frame(client_socket, handler(request))
+        except ConnectionError:
+            pass  # the client went away mid-frame, just drop the connection
+
+def start_framed_server(host="127.0.0.1", port=9997, handler=None, ready=None):
+    handler = handler or (lambda data: b"Thank you for: " + data)
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((host, port))
+    server_socket.listen(128)
+    print(f"Framed server started at {host} on port {port}.")
+    if ready is not None:
+        ready.set()
+    while True:
+        client_socket, addr = server_socket.accept()
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=serve_framed_connection, args=(client_socket, handler), daemon=True).start()
+
+class FramedClient:
+    """One persistent connection that carries many requests"""
+
+    def __init__(self, host="127.0.0.1", port=9997, max_frame=16 * 1024 * 1024):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = FrameReader(self.sock, max_frame=max_frame)
+
+    def request(self, payload):
+        send_frame(self.sock, payload)
+        return self.reader.read_frame()
+
+    def pipeline(self, payloads, depth=16, max_bytes=64 * 1024):
+        """
+        Keep up to `depth` requests and `max_bytes` of requests in flight; responses come
+        back in request order. Both sides use blocking sendall, so unread requests must fit
+        in the socket buffers: past max_bytes we read a response before sending more
+        (a single bigger request is still sent on its own).
+        """
+        responses = []
+        in_flight = collections.deque()  # sizes of the requests not answered yet
+        in_flight_bytes = 0
+        for payload in payloads:
+            size = HEADER.size + len(payload)
+            while in_flight and (len(in_flight) == depth or in_flight_bytes + size > max_bytes):
+                responses.append(self.reader.read_frame())
+                in_flight_bytes -= in_flight.popleft()
+            send_frame(self.sock, payload)
+            in_flight.append(size)
+            in_flight_bytes += size
+        for _ in range(len(in_flight)):
+            responses.append(self.reader.read_frame())
+        return responses
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def demo_framed_protocol():
+    ready = threading.Event()
+    threading.Thread(target=start_framed_server, kwargs={"ready": ready}, daemon=True).start()
+    ready.wait()
+
+    with FramedClient() as client:
+        print(client.request("Hello, Server!".encode('utf-8')).decode('utf-8'))
+        big = client.request(b"x" * 1000000)  # far more than one recv(1024)
+        print("Big response:", len(big), "bytes")
+
+        t = time.perf_counter()
+        for _ in range(10000):
+            client.request(b"ping")
+        print(f"one at a time : {10000 / (time.perf_counter() - t):.0f} requests/sec")
+
+        t = time.perf_counter()
+        client.pipeline([b"ping"] * 10000, depth=32)
+        print(f"pipelined (32): {10000 / (time.perf_counter() - t):.0f} requests/sec")
+
+#Client connection pool
+import asyncio
+import collections
+import contextlib
+
+class PooledConnection:
+    def __init__(self, host, port):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = FrameReader(self.sock)
+        self.last_used = time.monotonic()
+
+    def is_healthy(self):
+        # an idle connection must have nothing to read: b"" means the server closed it
+        try:
+            return self.sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) != b""
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+    def close(self):
+        self.sock.close()
+
+class ConnectionPool:
+    """
+    start_client connects, sends one message and closes every time, paying a handshake per
+    request and leaving a socket in TIME_WAIT. The pool keeps framed keep-alive connections
+    open and lends them out; it is safe to share between threads, and request_async lets
+    coroutines use it without blocking the event loop.
+    """
+
+    def __init__(self, host="127.0.0.1", port=9997, min_idle=2, max_idle=8, max_size=32,
+                 idle_timeout=30.0, max_waiters=128, wait_timeout=5.0):
+        self.host = host
+        self.port = port
+        self.min_idle = min_idle
+        self.max_idle = max_idle
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_waiters = max_waiters
+        self.wait_timeout = wait_timeout
+        self.idle = collections.deque()  # most recently used on the right
+        self.size = 0                    # idle + lent out
+        self.waiters = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        for _ in range(min_idle):
+            self.idle.append(PooledConnection(host, port))
+            self.size += 1
+
+    def _evict(self):
+        """Close connections that sat idle for too long, keeping min_idle of them (lock held)"""
+        now = time.monotonic()
+        while (len(self.idle) > self.min_idle
+               and now - self.idle[0].last_used > self.idle_timeout):
+            self.idle.popleft().close()
+            self.size -= 1
+
+    def acquire(self):
+        deadline = time.monotonic() + self.wait_timeout
+        with self.cond:
+            while True:
+                if self.closed:
+                    raise RuntimeError("connection pool is closed")
+                self._evict()
+                while self.idle:
+                    conn = self.idle.pop()
+                    if conn.is_healthy():
+                        return conn
+                    conn.close()
+                    self.size -= 1
+                if self.size < self.max_size:
+                    self.size += 1
+                    break
+                if self.waiters >= self.max_waiters:
+                    raise RuntimeError("too many callers waiting for a connection")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("no connection available after {} s".format(self.wait_timeout))
+                self.waiters += 1
+                try:
+                    self.cond.wait(remaining)
+                finally:
+                    self.waiters -= 1
+        try:
+            return PooledConnection(self.host, self.port)  # connect outside the lock
+        except OSError:
+            with self.cond:
+                self.size -= 1
+                self.cond.notify()
+            raise
+
+    def release(self, conn, broken=False):
+        with self.cond:
+            if broken or self.closed or len(self.idle) >= self.max_idle:
+                conn.close()
+                self.size -= 1
+            else:
+                conn.last_used = time.monotonic()
+                self.idle.append(conn)
+            self.cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, broken=True)  # the stream may be half read, never reuse it
+            raise
+        self.release(conn)
+
+    def request(self, payload):
+        with self.connection() as conn:
+            send_frame(conn.sock, payload)
+            response = conn.reader.read_frame()
+            if response is None:
+                raise ConnectionError("server closed the connection")
+            return response
+
+    async def request_async(self, payload):
+        return await asyncio.to_thread(self.request, payload)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            while self.idle:
+                self.idle.pop().close()
+                self.size -= 1
+            self.cond.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def connect_per_request(host, port):
+    # what start_client does, without the print
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.connect((host, port))
+    client_socket.send("Hello, Server!".encode('utf-8'))
+    data = client_socket.recv(1024).decode('utf-8')
+    client_socket.close()
+    return data
+
+def run_clients(func, threads=8, requests_per_thread=500):
+    workers = [threading.Thread(target=lambda: [func() for _ in range(requests_per_thread)])
+               for _ in range(threads)]
+    t = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * requests_per_thread / (time.perf_counter() - t)
+
+def bench_connection_pool():
+    # the original one-request-per-connection server, and the framed keep-alive server
+    threading.Thread(target=start_server, daemon=True).start()
+    ready = threading.Event()
+    threading.Thread(target=start_framed_server, kwargs={"ready": ready}, daemon=True).start()
+    ready.wait()
+    time.sleep(0.5)
+
+    host = socket.gethostname()
+    print(f"connect per request: {run_clients(lambda: connect_per_request(host, 9999)):.0f} requests/sec")
+    with ConnectionPool() as pool:
+        print(f"connection pool    : {run_clients(lambda: pool.request(b'Hello, Server!')):.0f} requests/sec")
+
+        async def main():
+            return await asyncio.gather(*(pool.request_async(b"async hello") for _ in range(20)))
+        print("asyncio callers    :", len(asyncio.run(main())), "responses")
+
+#Zero-copy file transfer
+import os
+import tempfile
+
+FILE_HEADER = struct.Struct("!Bq")  # status (0 = ok, 1 = error), body length
+FILE_OK, FILE_ERROR = 0, 1
+
+def _resolve(root, name):
+    # never serve anything outside the root directory
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([path, os.path.realpath(root)]) != os.path.realpath(root):
+        raise PermissionError(name)
+    return path
+
+def serve_file_connection(client_socket, root, zero_copy=True):
+    """
+    Answer framed requests "name\\0offset\\0length" (length -1 = until the end of the file).
+    The body goes out with socket.sendfile, so the kernel copies straight from the page cache
+    to the socket and the bytes never pass through Python.
+    """
+    reader = FrameReader(client_socket)
+    with client_socket:
+        while (request := reader.read_frame()) is not None:
+            # everything that can fail is checked before the OK header goes out
+            try:
+                name, offset, length = request.split(b"\0")
+                offset, length = int(offset), int(length)
+                f = open(_resolve(root, name.decode('utf-8')), "rb")
+            except (OSError, ValueError) as exc:
+                message = str(exc).encode('utf-8')
+                client_socket.sendall(FILE_HEADER.pack(FILE_ERROR, len(message)) + message)
+                continue
+            with f:
+                size = os.fstat(f.fileno()).st_size
+                offset = min(max(offset, 0), size)
+                count = size - offset if length < 0 else min(length, size - offset)
+                client_socket.sendall(FILE_HEADER.pack(FILE_OK, count))
+                if not count:
+                    continue  # sendfile refuses a count of 0
+                # the header is out: a failure now cannot be reported in-band,
+                # so the connection is closed rather than left out of step
+                try:
+                    if zero_copy:
+                        sent = client_socket.sendfile(f, offset, count)
+                    else:
+                        # the naive way: read into a new bytes object, then send it
+                        f.seek(offset)
+                        sent = 0
+                        while sent < count:
+                            chunk = f.read(min(count - sent, 1024 * 1024))
+                            if not chunk:
+                                break
+                            client_socket.sendall(chunk)
+                            sent += len(chunk)
+                except (OSError, ValueError):
+                    return
+                if sent != count:
+                    return  # the file shrank under us
+
+def start_file_server(root, host="127.0.0.1", port=9996, zero_copy=True, ready=None):
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((host, port))
+    server_socket.listen(128)
+    print(f"File server for {root} started at {host} on port {port}.")
+    if ready is not None:
+        ready.set()
+    while True:
+        client_socket, addr = server_socket.accept()
+        # header and body are two writes, Nagle would hold the body back for the delayed ACK
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=serve_file_connection, args=(client_socket, root, zero_copy),
+                         daemon=True).start()
+
+def recv_exactly_into(sock, view):
+    """Fill the whole memoryview with recv_into, no intermediate bytes objects"""
+    received = 0
+    while received < len(view):
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError("connection closed before the whole body arrived")
+        received += n
+
+class FileClient:
+    def __init__(self, host="127.0.0.1", port=9996):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.header = bytearray(FILE_HEADER.size)
+
+    def fetch(self, name, offset=0, length=-1, into=None):
+        """Return a memoryview of the requested bytes, received into `into` if it is big enough"""
+        send_frame(self.sock, "{}\0{}\0{}".format(name, offset, length).encode('utf-8'))
+        recv_exactly_into(self.sock, memoryview(self.header))
+        status, count = FILE_HEADER.unpack(self.header)
+        if into is None or len(into) < count:
+            into = bytearray(count)
+        view = memoryview(into)[:count]
+        recv_exactly_into(self.sock, view)
+        if status != FILE_OK:
+            raise OSError(bytes(view).decode('utf-8'))
+        return view
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def naive_fetch(sock, name):
+    # naive client: recv into new bytes objects and join them
+    send_frame(sock, "{}\0{}\0{}".format(name, 0, -1).encode('utf-8'))
+    status, count = FILE_HEADER.unpack(sock.recv(FILE_HEADER.size, socket.MSG_WAITALL))
+    chunks, received = [], 0
+    while received < count:
+        chunk = sock.recv(1024 * 1024)
+        chunks.append(chunk)
+        received += len(chunk)
+    return b"".join(chunks)
+
+def bench_file_transfer():
+    root = tempfile.mkdtemp()
+    size = 256 * 1024 * 1024
+    with open(os.path.join(root, "snapshot.bin"), "wb") as f:
+        f.write(os.urandom(1024 * 1024) * (size // (1024 * 1024)))
+
+    for port, zero_copy in ((9996, True), (9995, False)):
+        ready = threading.Event()
+        threading.Thread(target=start_file_server, args=(root,),
+                         kwargs={"port": port, "zero_copy": zero_copy, "ready": ready}, daemon=True).start()
+        ready.wait()
+
+    with FileClient(port=9996) as client:
+        print("Range 10-20:", bytes(client.fetch("snapshot.bin", 10, 10)).hex())
+        buffer = bytearray(size)
+        t = time.perf_counter()
+        for _ in range(4):
+            client.fetch("snapshot.bin", into=buffer)
+        print(f"sendfile + recv_into : {4 * size / (time.perf_counter() - t) / 1e9:.2f} GB/s")
+
+    with socket.create_connection(("127.0.0.1", 9995)) as naive_socket:
+        t = time.perf_counter()
+        for _ in range(4):
+            naive_fetch(naive_socket, "snapshot.bin")
+        print(f"read/send + recv     : {4 * size / (time.perf_counter() - t) / 1e9:.2f} GB/s")
+
+    os.remove(os.path.join(root, "snapshot.bin"))
+    os.rmdir(root)
+
+#Pre-fork SO_REUSEPORT server
+import multiprocessing
+
+def handle_client(client_socket):
+    # the same exchange as start_server, without the prints
+    with client_socket:
+        data = client_socket.recv(1024)
+        client_socket.sendall("Thank you for connecting".encode('utf-8'))
+    return len(data)
+
+def reuseport_worker(worker_id, host, port, conn, stop):
+    """
+    One process with its own listening socket. SO_REUSEPORT lets every worker bind the same
+    port and the kernel spreads new connections over them, so there is no shared accept lock.
+    Stats only go to the parent when it asks for them, so the pipe can never fill up and
+    block the worker.
+    """
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server_socket.bind((host, port))
+    server_socket.listen(1024)
+    server_socket.settimeout(0.2)  # wake up now and then to check `stop`
+    stats = {"worker": worker_id, "pid": os.getpid(), "connections": 0, "bytes": 0, "errors": 0}
+    conn.send(("ready", stats))
+
+    def serve(client_socket):
+        # a reset or idle client only costs its own connection, never the worker
+        client_socket.settimeout(5)
+        try:
+            stats["bytes"] += handle_client(client_socket)
+            stats["connections"] += 1
+        except OSError:
+            stats["errors"] += 1
+
+    while not stop.is_set():
+        try:
+            client_socket, addr = server_socket.accept()
+        except socket.timeout:
+            pass
+        else:
+            serve(client_socket)
+        while conn.poll():
+            conn.recv()  # the only request is "stats"
+            conn.send(("stats", dict(stats)))
+
+    # graceful stop: serve what is already queued on this socket, then leave
+    server_socket.setblocking(False)
+    while True:
+        try:
+            client_socket, addr = server_socket.accept()
+        except BlockingIOError:
+            break
+        serve(client_socket)  # blocking again, but still with the 5 s timeout
+    server_socket.close()
+    conn.send(("exit", stats))
+    conn.close()
+
+class PreforkServer:
+    def __init__(self, workers=None, host="127.0.0.1", port=9994, check_interval=0.5):
+        self.size = workers or multiprocessing.cpu_count()
+        self.host = host
+        self.port = port
+        self.check_interval = check_interval
+        self.workers = {}  # worker_id -> (process, our end of the pipe, stop event)
+        self.stats = {}    # worker_id -> last stats received
+        self.next_id = 0
+        self.respawns = 0
+        self.lock = threading.RLock()  # the monitor thread changes self.workers too
+        self.stopping = threading.Event()
+        self.monitor = None
+
+    def _start_worker(self):
+        worker_id = self.next_id
+        self.next_id += 1
+        parent_conn, child_conn = multiprocessing.Pipe()
+        stop = multiprocessing.Event()
+        process = multiprocessing.Process(target=reuseport_worker,
+                                          args=(worker_id, self.host, self.port, child_conn, stop))
+        process.start()
+        child_conn.close()
+        kind, stats = parent_conn.recv()  # wait until it is listening
+        self.workers[worker_id] = (process, parent_conn, stop)
+        self.stats[worker_id] = stats
+        return worker_id
+
+    def _stop_worker(self, worker_id):
+        process, conn, stop = self.workers.pop(worker_id)
+        stop.set()
+        try:
+            kind, stats = conn.recv()  # "exit", with the final stats
+            self.stats[worker_id] = stats
+        except (EOFError, OSError):
+            pass  # it died on its way out, keep the last stats we had
+        conn.close()
+        process.join()
+
+    def respawn_dead(self):
+        """Replace the workers that died, return how many were replaced"""
+        with self.lock:
+            dead = [worker_id for worker_id, (process, _, _) in self.workers.items()
+                    if not process.is_alive()]
+            for worker_id in dead:
+                process, conn, _ = self.workers.pop(worker_id)
+                conn.close()
+                process.join()
+                self._start_worker()
+            self.respawns += len(dead)
+            return len(dead)
+
+    def _monitor(self):
+        while not self.stopping.wait(self.check_interval):
+            self.respawn_dead()
+
+    def start(self):
+        with self.lock:
+            for _ in range(self.size):
+                self._start_worker()
+        self.stopping.clear()
+        self.monitor = threading.Thread(target=self._monitor, daemon=True)
+        self.monitor.start()
+
+    def collect_stats(self):
+        """Ask every running worker for its stats, return the latest per worker"""
+        with self.lock:
+            asked = []
+            for worker_id, (_, conn, _) in self.workers.items():
+                try:
+                    conn.send("stats")
+                    asked.append(worker_id)
+                except OSError:
+                    pass  # dead worker, respawned below
+            for worker_id in asked:
+                try:
+                    kind, stats = self.workers[worker_id][1].recv()
+                    self.stats[worker_id] = stats
+                except (EOFError, OSError):
+                    pass
+            self.respawn_dead()
+            return dict(self.stats)
+
+    def rolling_restart(self):
+        """Replace the workers one by one; the port never stops accepting connections"""
+        with self.lock:
+            for worker_id in list(self.workers):
+                self._start_worker()  # the new one listens before the old one goes away
+                self._stop_worker(worker_id)
+
+    def stop(self):
+        self.stopping.set()
+        if self.monitor is not None:
+            self.monitor.join()
+            self.monitor = None
+        with self.lock:
+            for worker_id in list(self.workers):
+                self._stop_worker(worker_id)
+
+def bench_prefork_server():
+    for workers in range(1, multiprocessing.cpu_count() + 1):
+        server = PreforkServer(workers)
+        server.start()
+        print(f"{workers} worker(s): ", end="")
+        load_generator(port=server.port, connections=5000, concurrency=200)
+        if workers == 1:
+            server.rolling_restart()
+            print("after rolling restart: ", end="")
+            load_generator(port=server.port, connections=1000, concurrency=50)
+        server.stop()
+        print("served per worker:", {w: s["connections"] for w, s in server.collect_stats().items()})
+
+#Run one of the examples: python Socket.py [command]
+COMMANDS = {
+    "server": start_server,
+    "client": start_client,
+    "concurrent": start_concurrent_server,
+    "bench": bench_concurrent_server,
+    "framed": demo_framed_protocol,
+    "pool": bench_connection_pool,
+    "files": bench_file_transfer,
+    "prefork": bench_prefork_server,
+}
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "server"
+    if command not in COMMANDS:
+        print("usage: python Socket.py [{}]".format("|".join(COMMANDS)))
+        sys.exit(2)
+    COMMANDS[command]()